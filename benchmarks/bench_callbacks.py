@@ -0,0 +1,50 @@
+# Микро-бенчмарк маршрутизации callback-кнопок: стоимость поиска обработчика
+# в CallbackRouter (словарь) против цепочки lambda-фильтров (как было раньше)
+# при разном количестве зарегистрированных action.
+#
+#   python benchmarks/bench_callbacks.py
+
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from callbacks import CallbackRouter, pack  # noqa: E402
+
+LOOKUPS = 100_000
+
+
+async def handler(callback, arg):
+    pass
+
+
+def bench(n: int):
+    router = CallbackRouter()
+    filters = []
+    for i in range(n):
+        router.action(f"a{i}")(handler)
+        filters.append((lambda prefix: lambda data: data.startswith(prefix))(f"a{i}:"))
+
+    rnd = random.Random(n)
+    samples = [pack(f"a{rnd.randrange(n)}", "post_867371536_1773581400") for _ in range(1000)]
+
+    def via_router():
+        for data in samples:
+            router.resolve(data)
+
+    def via_filters():
+        for data in samples:
+            next(f for f in filters if f(data))
+
+    rounds = LOOKUPS // len(samples)
+    t_router = timeit.timeit(via_router, number=rounds) / LOOKUPS * 1e9
+    t_filters = timeit.timeit(via_filters, number=rounds) / LOOKUPS * 1e9
+    print(f"{n:>5} action | CallbackRouter: {t_router:8.0f} нс | цепочка фильтров: {t_filters:10.0f} нс")
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 1000):
+        bench(n)
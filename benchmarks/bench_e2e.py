@@ -0,0 +1,172 @@
+# Сквозной офлайн-бенчмарк: Dispatcher из main работает против локальной
+# заглушки Bot API (fake_api.py). Прогоняются сценарии PostForm и EditForm,
+# массовое планирование и срабатывание постов. Отчёт: перцентили задержки
+# обработчиков, пропускная способность планирования, задержка публикации,
+# пиковая память.
+#
+#   python benchmarks/bench_e2e.py [--flows 200] [--posts 2000]
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from aiogram.types import Update  # noqa: E402
+
+from fake_api import FakeTelegramAPI, bench_config, percentiles  # noqa: E402
+
+_update_ids = itertools.count(1)
+
+
+def message_update(bot, user_id: int, text: str) -> Update:
+    uid = next(_update_ids)
+    data = {
+        "update_id": uid,
+        "message": {
+            "message_id": uid,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            "text": text,
+        },
+    }
+    return Update.model_validate(data, context={"bot": bot})
+
+
+def callback_update(bot, user_id: int, data: str, message_id: int = None) -> Update:
+    uid = next(_update_ids)
+    payload = {
+        "update_id": uid,
+        "callback_query": {
+            "id": str(uid),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            "message": {
+                "message_id": message_id or uid,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "menu",
+            },
+        },
+    }
+    return Update.model_validate(payload, context={"bot": bot})
+
+
+class Runner:
+    def __init__(self, main):
+        self.main = main
+        self.latency = defaultdict(list)
+
+    async def feed(self, step: str, update: Update):
+        t0 = time.perf_counter()
+        await self.main.dp.feed_update(self.main.bot, update)
+        self.latency[step].append((time.perf_counter() - t0) * 1000)
+
+    async def post_flow(self, user_id: int, day: datetime, minute: int):
+        bot = self.main.bot
+        await self.feed("create", callback_update(bot, user_id, "new"))
+        await self.feed("text", message_update(bot, user_id, f"Пост <b>{user_id}</b> {minute}"))
+        await self.feed("media", callback_update(bot, user_id, "media:none"))
+        await self.feed("buttons", callback_update(bot, user_id, "btns:add"))
+        await self.feed("buttons_text", message_update(bot, user_id, "Сайт | https://example.com"))
+        await self.feed("date", message_update(bot, user_id, day.strftime("%d.%m.%Y")))
+        await self.feed("time", message_update(bot, user_id, f"{minute // 60:02d}:{minute % 60:02d}"))
+        await self.feed("repeat", callback_update(bot, user_id, "rep:daily" if minute % 10 == 0 else "rep:once"))
+        await self.feed("confirm", callback_update(bot, user_id, "pub:ok"))
+
+    async def edit_flow(self, user_id: int, job_id: str, new_when: datetime):
+        bot = self.main.bot
+        await self.feed("edit_open", callback_update(bot, user_id, f"ed:{job_id}"))
+        await self.feed("edit_time", callback_update(bot, user_id, f"ed_time:{job_id}"))
+        await self.feed("edit_time_text", message_update(bot, user_id, new_when.strftime("%d.%m.%Y %H:%M")))
+        await self.feed("edit_save", callback_update(bot, user_id, "ed_save"))
+        await self.feed("list", callback_update(bot, user_id, "ls"))
+
+
+async def run(args):
+    api = await FakeTelegramAPI(latency=args.api_latency).start()
+
+    import main
+    from publisher import Publisher
+
+    logging.getLogger().setLevel(logging.WARNING)
+    main.create_app(bench_config())
+    await main.load_remaining()
+    main.bot.session = api.session()
+    # Лимиты Telegram в бенчмарке не нужны: меряем собственные накладные расходы
+    main.publisher = Publisher(global_rate=10_000, chat_rate=10_000, chat_burst=10_000)
+    runner = Runner(main)
+
+    # 1. Сценарии PostForm и EditForm от разных админов
+    tomorrow = datetime.now() + timedelta(days=1)
+    for i in range(args.flows):
+        await runner.post_flow(1000 + i, tomorrow, i % 1440)
+    for i, post in enumerate(list(main.registry)[:args.flows]):
+        new_when = tomorrow + timedelta(days=1, minutes=i)
+        await runner.edit_flow(post.user_id, post.job_id, new_when)
+
+    print("Задержка обработчиков:")
+    for step, values in runner.latency.items():
+        print(f"  {step:<15} {percentiles(values)}")
+
+    # 2. Массовое планирование
+    await main.on_startup(main.bot)
+    fire_at = datetime.now() + timedelta(seconds=args.fire_delay)
+    t0 = time.perf_counter()
+    for i in range(args.posts):
+        when = fire_at + timedelta(milliseconds=i * args.spacing_ms)
+        post = main.Post(f"bench_{i}", 1, when, f"bench_{i}")
+        main.add_post(post)
+        main.schedule_post(post)
+    elapsed = time.perf_counter() - t0
+    print(f"Планирование: {args.posts} постов за {elapsed * 1000:.0f} мс ({args.posts / elapsed:.0f} постов/с)")
+
+    # 3. Срабатывание и задержка публикации
+    deadline = time.monotonic() + args.fire_delay + args.posts * args.spacing_ms / 1000 + 60
+    while any(p.job_id.startswith("bench_") for p in main.registry.next_due(1)):
+        if time.monotonic() > deadline:
+            print("Не все посты опубликованы за отведённое время")
+            break
+        await asyncio.sleep(0.05)
+
+    scheduled = {f"bench_{i}": fire_at + timedelta(milliseconds=i * args.spacing_ms) for i in range(args.posts)}
+    lags = [
+        (received - scheduled[params["text"]].timestamp()) * 1000
+        for received, method, params in api.calls_by_method("sendMessage")
+        if params.get("text", "") in scheduled
+    ]
+    if lags:
+        print(f"Задержка публикации: {percentiles(lags)}, опубликовано {len(lags)}/{args.posts}")
+
+    await main.on_shutdown(main.bot)
+    await main.bot.session.close()
+    await api.stop()
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Пиковая память (max RSS): {peak_kb / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flows", type=int, default=200, help="сценариев создания/редактирования")
+    parser.add_argument("--posts", type=int, default=2000, help="постов для массового планирования")
+    parser.add_argument("--spacing-ms", type=int, default=2, help="интервал между постами, мс")
+    parser.add_argument("--fire-delay", type=float, default=3.0, help="через сколько секунд начнут срабатывать")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(args))
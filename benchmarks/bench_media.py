@@ -0,0 +1,97 @@
+# Публикация постов с медиа: вызовы Bot API и задержка на пост.
+# Сравниваются альбом из --items фото, опубликованный отдельными постами
+# (как приходилось до поддержки альбомов), и одним sendMediaGroup; файлы
+# по URL (из импорта) — без кэша file_id и с ним. Заглушка Bot API
+# (fake_api.py) задерживает каждый ответ на --api-latency, а каждый файл,
+# присланный по URL, — ещё на --upload секунд.
+#
+#   python benchmarks/bench_media.py [--posts 50] [--items 5] [--channels 3]
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeTelegramAPI, bench_config, percentiles  # noqa: E402
+
+
+async def publish(main, api, name: str, posts: list):
+    # posts — [[Post, ...], ...]: посты, которые вместе составляют одну публикацию
+    calls, uploads = len(api.calls), api.uploads
+    lags = []
+    for group in posts:
+        t0 = time.perf_counter()
+        for post in group:
+            main.add_post(post)
+            await main.publish_post(post.job_id)
+        lags.append(time.perf_counter() - t0)
+    per_post = (len(api.calls) - calls) / len(posts)
+    print(f"{name:<34} вызовов API на пост: {per_post:5.1f}, загрузок по URL: {api.uploads - uploads:4d}, "
+          f"время публикации {percentiles(lags, 1000, 1)}")
+
+
+async def run(args):
+    api = await FakeTelegramAPI(latency=args.api_latency, upload=args.upload).start()
+
+    import main
+    from file_cache import FileCache
+    from post_model import Post
+    from publisher import Publisher
+
+    logging.getLogger().setLevel(logging.WARNING)
+    channels = {-1001 - i: f"Канал {i}" for i in range(args.channels)}
+    main.create_app(bench_config(channels=channels))
+    await main.load_remaining()
+    main.bot.session = api.session()
+    main.publisher = Publisher(global_rate=10_000, chat_rate=10_000, chat_burst=10_000)
+    await main.on_startup(main.bot)
+
+    base = datetime.now() + timedelta(days=1)
+    counter = iter(range(10**9))
+
+    def post(**media):
+        n = next(counter)
+        return Post(f"media_{n}", 1, base + timedelta(minutes=n), f"Пост {n}", **media)
+
+    print(f"Постов: {args.posts}, файлов в альбоме: {args.items}, каналов: {args.channels}")
+    file_ids = [f"AgACAgIAAx{i}" for i in range(args.items)]
+    await publish(main, api, "альбом отдельными постами", [
+        [post(media_type="photo", media_id=f) for f in file_ids] for _ in range(args.posts)
+    ])
+    await publish(main, api, "альбом одним sendMediaGroup", [
+        [post(media_type="album", album=[{"type": "photo", "id": f} for f in file_ids])] for _ in range(args.posts)
+    ])
+
+    urls = [f"https://example.com/banner{i}.jpg" for i in range(args.items)]
+    for name, cache in (("альбом по URL, без кэша file_id", FileCache(0)),
+                        ("альбом по URL, с кэшем file_id", FileCache())):
+        main.file_cache = cache
+        await publish(main, api, name, [
+            [post(media_type="album", album=[{"type": "photo", "id": u} for u in urls])] for _ in range(args.posts)
+        ])
+
+    await main.on_shutdown(main.bot)
+    await main.bot.session.close()
+    await api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=50, help="публикаций в каждом сценарии")
+    parser.add_argument("--items", type=int, default=5, help="файлов в альбоме")
+    parser.add_argument("--channels", type=int, default=3, help="каналов для публикации")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument("--upload", type=float, default=0.2, help="задержка на файл, отправленный по URL, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(args))
@@ -0,0 +1,93 @@
+# Очередь апдейтов по чатам под нагрузкой: много админов одновременно
+# проходят PostForm, все апдейты приходят разом (как пачка из getUpdates) и
+# обрабатываются задачами, включая двойное нажатие «Опубликовать». Проверяется,
+# что у каждого админа ровно один пост, и меряется пропускная способность при
+# разных ограничениях параллельности.
+#
+#   python benchmarks/bench_ordering.py [--admins 200] [--concurrency 1 8 32] [--api-latency 0.005]
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from bench_e2e import message_update, callback_update  # noqa: E402
+from fake_api import FakeTelegramAPI, bench_config  # noqa: E402
+
+
+def flow(bot, user_id: int, day: datetime, minute: int) -> list:
+    confirm_message = 10_000_000 + user_id
+    return [
+        callback_update(bot, user_id, "new"),
+        message_update(bot, user_id, f"Пост {user_id}"),
+        callback_update(bot, user_id, "media:none"),
+        callback_update(bot, user_id, "btns:none"),
+        message_update(bot, user_id, day.strftime("%d.%m.%Y")),
+        message_update(bot, user_id, f"{minute // 60:02d}:{minute % 60:02d}"),
+        callback_update(bot, user_id, "rep:once"),
+        callback_update(bot, user_id, "pub:ok", message_id=confirm_message),
+        callback_update(bot, user_id, "pub:ok", message_id=confirm_message),    # двойное нажатие
+    ]
+
+
+async def round_trip(main, admins: range, concurrency: int, day: datetime):
+    queue = main.update_queue
+    queue.concurrency, queue._slots = concurrency, None
+    queue.max_pending = max(queue.max_pending, len(admins) * 9)    # вся пачка помещается в очереди
+    shed, duplicates = queue.shed, queue.duplicates
+
+    flows = [flow(main.bot, user_id, day, i % 1440) for i, user_id in enumerate(admins)]
+    t0 = time.perf_counter()
+    # Шаги разных админов вперемешку, как в общей ленте апдейтов
+    tasks = [
+        asyncio.create_task(main.dp.feed_update(main.bot, steps[i]))
+        for i in range(len(flows[0])) for steps in flows
+    ]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+
+    per_admin = [len(main.registry.for_user(user_id)) for user_id in admins]
+    print(f"concurrency={concurrency:<3} {len(tasks)} апдейтов за {elapsed * 1000:.0f} мс "
+          f"({len(tasks) / elapsed:.0f}/с); постов: ровно один у {per_admin.count(1)} из {len(admins)}, "
+          f"больше одного у {sum(n > 1 for n in per_admin)}; "
+          f"повторов отброшено {queue.duplicates - duplicates}, отказов {queue.shed - shed}")
+
+
+async def run(args):
+    api = await FakeTelegramAPI(latency=args.api_latency).start()
+
+    import main
+
+    logging.getLogger().setLevel(logging.ERROR)
+    main.create_app(bench_config())
+    await main.load_remaining()
+    main.bot.session = api.session()
+    for n, concurrency in enumerate(args.concurrency):
+        first = 1000 + n * args.admins
+        # У каждого прогона свой день: иначе слоты заняты постами прошлого прогона
+        day = datetime.now() + timedelta(days=1 + n)
+        await round_trip(main, range(first, first + args.admins), concurrency, day)
+
+    await asyncio.to_thread(main.store_writer.close)
+    await main.bot.session.close()
+    await api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--admins", type=int, default=200, help="админов, проходящих PostForm одновременно")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="UPDATE_CONCURRENCY")
+    parser.add_argument("--api-latency", type=float, default=0.005, help="задержка ответа заглушки, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(args))
@@ -0,0 +1,81 @@
+# Замер задержек цикла событий при серии удалений: запись в хранилище прямо
+# в обработчике против фоновой записи через WriteBehind. Параллельно с
+# удалениями работает «пульс» — корутина, которая просыпается каждую
+# миллисекунду и замечает, насколько позже положенного она проснулась.
+#
+#   python benchmarks/bench_persistence.py [--posts 1000] [--backend sqlite|journal]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import make_posts  # noqa: E402
+from fake_api import percentiles  # noqa: E402
+from post_store import open_store, WriteBehind  # noqa: E402
+
+
+async def heartbeat(stalls: list, stop: asyncio.Event):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(max(0.0, (time.perf_counter() - t0) * 1000 - 1))
+
+
+async def burst(delete, job_ids):
+    # Как поток callback'ов «удалить»: между удалениями цикл свободен
+    costs = []
+    for job_id in job_ids:
+        t0 = time.perf_counter()
+        delete(job_id)
+        costs.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0)
+    return costs
+
+
+async def measure(label: str, store, delete, job_ids):
+    stalls, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(0.01)
+    t0 = time.perf_counter()
+    costs = await burst(delete, job_ids)
+    elapsed = (time.perf_counter() - t0) * 1000
+    stop.set()
+    await beat
+    print(f"{label}:")
+    print(f"  удаление в обработчике  {percentiles(costs, digits=3)}, всего {sum(costs):.0f} мс за {elapsed:.0f} мс")
+    print(f"  задержка цикла событий  {percentiles(stalls, digits=3)}")
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "posts")
+        store = open_store(args.backend, path)
+        posts = list(make_posts(args.posts * 2))
+        store.upsert_many(posts)
+        ids = [p.job_id for p in posts]
+
+        await measure("Запись в обработчике", store, store.delete, ids[:args.posts])
+
+        flushes = []
+        writer = WriteBehind(store, args.window, on_flush=lambda s, n: flushes.append(n))
+        await measure("Фоновая запись (WriteBehind)", store, writer.delete, ids[args.posts:])
+        t0 = time.perf_counter()
+        writer.close()
+        print(f"  сброс при остановке {(time.perf_counter() - t0) * 1000:.0f} мс, "
+              f"пакетов {len(flushes)}, изменений {sum(flushes)}, осталось постов {store.count()}")
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1000, help="удалений в серии")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "journal"])
+    parser.add_argument("--window", type=float, default=0.05, help="окно склейки WriteBehind, с")
+    asyncio.run(run(parser.parse_args()))
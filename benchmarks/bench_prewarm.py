@@ -0,0 +1,85 @@
+# Задержка публикации после простоя: холодный пул соединений против
+# прогретого ConnectionWarmer. Заглушка Bot API (fake_api.py) задерживает
+# первый запрос каждого нового соединения на --handshake секунд — так
+# изображается цена DNS, TCP и TLS. Простой между волнами длиннее keep-alive,
+# поэтому к началу волны пул пуст.
+#
+#   python benchmarks/bench_prewarm.py [--rounds 5] [--chats 10] [--handshake 0.15]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from aiogram import Bot  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+from connection_pool import ConnectionWarmer, track_connection  # noqa: E402
+from fake_api import FakeTelegramAPI, percentiles  # noqa: E402
+from publisher import Publisher  # noqa: E402
+
+
+async def wave(bot, publisher, fire: datetime, chats: int, lags: dict):
+    async def send(chat_id):
+        with track_connection() as use:
+            return await bot(SendMessage(chat_id=chat_id, text="пост")), use
+
+    await asyncio.sleep(max(0.0, (fire - datetime.now()).total_seconds()))
+    fire_time = fire.timestamp()
+    futures = [
+        publisher.submit(fire_time, -100 - i, lambda c=-100 - i: send(c), label="bench")
+        for i in range(chats)
+    ]
+    for _, use in await asyncio.gather(*futures):
+        lags.setdefault(use.label, []).append(time.time() - fire_time)
+
+
+async def run(args):
+    api = await FakeTelegramAPI(handshake=args.handshake).start()
+    bot = Bot("42:BENCH", session=api.session(keepalive=args.keepalive))
+    publisher = Publisher(global_rate=1000, chat_rate=1000, chat_burst=1000, concurrency=args.chats)
+    publisher.start()
+
+    results = {}
+    for mode in ("холодный пул", "прогрев"):
+        lags, opened = {}, bot.session.opened
+        for _ in range(args.rounds):
+            await asyncio.sleep(args.keepalive + 0.5)   # простой: соединения пула истекли
+            fire = datetime.now() + timedelta(seconds=args.lead + 0.5)
+            warmer = None
+            if mode == "прогрев":
+                warmer = ConnectionWarmer(bot, lambda now, f=fire: (f, args.chats), lead=args.lead,
+                                          max_connections=args.chats, tick=0.05)
+                warmer.start()
+            await wave(bot, publisher, fire, args.chats, lags)
+            if warmer:
+                await warmer.stop()
+        results[mode] = (lags, bot.session.opened - opened)
+
+    for mode, (lags, opened) in results.items():
+        print(f"{mode}: новых соединений {opened}")
+        everything = [lag for values in lags.values() for lag in values]
+        print(f"  задержка публикации       {percentiles(everything, 1000, 1)}")
+        for label in ("cold", "warm"):
+            if label in lags:
+                print(f"    connection={label:<5}         {percentiles(lags[label], 1000, 1)}")
+
+    await publisher.stop()
+    await bot.session.close()
+    await api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5, help="волн публикаций в каждом режиме")
+    parser.add_argument("--chats", type=int, default=10, help="отправок в волне (разные чаты)")
+    parser.add_argument("--handshake", type=float, default=0.15, help="цена нового соединения, с")
+    parser.add_argument("--keepalive", type=float, default=1.0, help="keep-alive пула, с")
+    parser.add_argument("--lead", type=float, default=0.5, help="за сколько до волны прогревать, с")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,106 @@
+# Поиск по отложенным постам: время запроса через обратный индекс
+# (SearchIndex) против перебора всех постов с поиском подстроки, как
+# пришлось бы делать без индекса, и стоимость обновления индекса.
+#
+#   python benchmarks/bench_search.py [--posts 50000]
+
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from post_model import Post  # noqa: E402
+from post_registry import PostRegistry  # noqa: E402
+from search_index import SearchIndex, parse_query, words  # noqa: E402
+
+RARE = ["распродажа", "вебинар", "розыгрыш", "анонс", "скидка", "конкурс", "подкаст", "стрим"]
+COMMON = ["новости", "сегодня", "канал", "подписывайтесь", "ссылка", "время", "неделя", "обзор"]
+QUERIES = [
+    "новости",                                  # частое слово
+    "вебинар",                                  # редкое слово
+    "распрод",                                  # префикс
+    "скидка сегодня",                           # два слова
+    "новости с {d1} по {d2}",                   # частое слово в узком периоде
+    "{d1}",                                     # весь день без слов
+]
+
+
+def make_posts(n: int, rnd: random.Random) -> list:
+    start = datetime.now().replace(second=0, microsecond=0) + timedelta(days=1)
+    posts = []
+    for i in range(n):
+        body = rnd.sample(COMMON, 3) + [f"слово{rnd.randrange(5000)}" for _ in range(6)]
+        if rnd.random() < 0.02:
+            body.append(rnd.choice(RARE))
+        rnd.shuffle(body)
+        buttons = [[{"text": rnd.choice(["Подробнее", "Купить", "Регистрация"]), "url": "https://example.com"}]]
+        posts.append(Post(
+            f"post_1_{i}", 1, start + timedelta(minutes=i), "<b>" + " ".join(body) + "</b>",
+            buttons=buttons if rnd.random() < 0.3 else None,
+        ))
+    return posts
+
+
+def scan(posts: list, query: str) -> list:
+    # Без индекса: каждое слово — подстрока текста или подписей кнопок
+    terms, start, end = parse_query(query)
+    found = []
+    for post in posts:
+        if start and post.when < start or end and post.when > end:
+            continue
+        haystack = " ".join(words(post.text) | {w for row in post.buttons or () for b in row for w in words(b["text"])})
+        if all(t in haystack for t in terms):
+            found.append(post.job_id)
+    return found
+
+
+def timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main(args):
+    rnd = random.Random(1)
+    posts = make_posts(args.posts, rnd)
+    registry = PostRegistry(posts)
+
+    t0 = time.perf_counter()
+    index = SearchIndex(registry)
+    print(f"Постов: {len(posts)}, построение индекса: {(time.perf_counter() - t0) * 1000:.0f} мс")
+
+    d1 = posts[len(posts) // 2].when.strftime("%d.%m.%Y")
+    d2 = (posts[len(posts) // 2].when + timedelta(days=1)).strftime("%d.%m.%Y")
+    for template in QUERIES:
+        query = template.format(d1=d1, d2=d2)
+        terms, start, end = parse_query(query)
+
+        def indexed():
+            index._results.clear()      # без кэша выдачи: каждый раз настоящий поиск
+            return index.search(terms, start, end)
+
+        found = indexed()
+        t_index = timed(indexed, 20)
+        t_cached = timed(lambda: index.search(terms, start, end), 1000)
+        t_scan = timed(lambda: scan(posts, query), 1)
+        print(f"{query:<36} найдено {len(found):>6} | индекс: {t_index:7.2f} мс "
+              f"(листание: {t_cached * 1000:5.1f} мкс) | перебор: {t_scan:8.1f} мс")
+
+    sample = rnd.sample(posts, 1000)
+    t_update = timed(lambda: [index.add(replace(p, text=p.text + f" правка{i}")) for i, p in enumerate(sample)], 1)
+    t_remove = timed(lambda: [index.remove(p.job_id) for p in sample], 1)
+    print(f"Обновление индекса: правка текста {t_update * 1000 / len(sample):.1f} мкс/пост, "
+          f"удаление {t_remove * 1000 / len(sample):.1f} мкс/пост")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=50_000, help="постов в очереди")
+    main(parser.parse_args())
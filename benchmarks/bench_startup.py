@@ -0,0 +1,74 @@
+# Замер времени запуска в зависимости от размера очереди.
+# Для каждого размера создаётся временное хранилище, затем в отдельном процессе
+# импортируется main, вызывается create_app() и restore_jobs() — это время до
+# начала приёма апдейтов. Отдельно меряется фоновая дозагрузка очереди и, для
+# сравнения, загрузка всей очереди сразу, как было до create_app.
+#
+#   python benchmarks/bench_startup.py [--sizes 1000 10000 50000]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from post_model import Post  # noqa: E402
+from post_store import SQLitePostStore  # noqa: E402
+
+CHILD = """
+import asyncio, sys, time
+sys.path.insert(0, {root!r})
+import aiogram.types, apscheduler.schedulers.asyncio  # зависимости не входят в замер
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.create_app(main.Config(bot_token="123456:bench", admin_ids=[1], channels={{-1001: "Канал"}}))
+t2 = time.perf_counter()
+jobs = main.restore_jobs()
+t3 = time.perf_counter()
+asyncio.run(main.load_remaining())
+t4 = time.perf_counter()
+
+from post_store import SQLitePostStore
+store = SQLitePostStore("scheduled_posts.db")
+t5 = time.perf_counter()
+registry = main.PostRegistry(store.load_all())
+main.SlotAllocator(main.config.channels, main.config.post_spacing, posts=registry)
+main.SearchIndex(registry)
+t6 = time.perf_counter()
+ms = lambda a, b: f"{{(b - a) * 1000:.1f}}"
+print(len(main.registry), jobs, ms(t0, t1), ms(t1, t2), ms(t2, t3), ms(t3, t4), ms(t5, t6))
+"""
+
+
+def make_posts(n: int):
+    now = datetime.now()
+    for i in range(n):
+        when = now + timedelta(minutes=10 + i * 43200 // max(n, 1))
+        yield Post(f"post_1_{i}", 1, when, f"Пост номер {i}")
+
+
+def run(n: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLitePostStore(os.path.join(tmp, "scheduled_posts.db"))
+        store.upsert_many(make_posts(n))
+        store.close()
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=ROOT)],
+            cwd=tmp, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        posts, jobs, import_ms, create_ms, restore_ms, background_ms, full_ms = out[-7:]
+        print(f"{n:>7} постов | задач: {jobs:>5} | import: {import_ms:>6} мс | create_app: {create_ms:>7} мс | "
+              f"restore_jobs: {restore_ms:>6} мс | дозагрузка в фоне: {background_ms:>8} мс | "
+              f"вся очередь сразу: {full_ms:>8} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="размеры очереди")
+    for n in parser.parse_args().sizes:
+        run(n)
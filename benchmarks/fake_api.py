@@ -0,0 +1,137 @@
+# Локальная заглушка Bot API на aiohttp. Принимает запросы вида
+# /bot<token>/<method>, отвечает правдоподобными результатами и записывает
+# каждый вызов с временем получения — для замеров без Telegram.
+# handshake — задержка первого запроса по новому соединению: так локально
+# изображается цена DNS, TCP и TLS до настоящего Bot API.
+# upload — задержка отправки медиа по URL: Telegram скачивает и загружает
+# файл заново, по file_id — нет.
+
+import asyncio
+import itertools
+import json
+import time
+
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from config import Config
+from connection_pool import TunedAiohttpSession
+
+
+def bench_config(**overrides) -> Config:
+    # Настройки для замеров: токен-заглушка, один админ и один канал, без /metrics
+    values = dict(bot_token="123456:bench", admin_ids=[1], channels={-1001: "Канал"}, metrics_listen_port=None)
+    values.update(overrides)
+    return Config(**values)
+
+
+def percentiles(values, scale: float = 1.0, digits: int = 2) -> str:
+    # Перцентили задержек в мс; scale=1000, если значения в секундах
+    values = sorted(v * scale for v in values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return (f"p50={pick(0.5):7.{digits}f} p95={pick(0.95):7.{digits}f} p99={pick(0.99):7.{digits}f} "
+            f"max={values[-1]:7.{digits}f} мс (n={len(values)})")
+
+
+class FakeTelegramAPI:
+    def __init__(self, latency: float = 0.0, handshake: float = 0.0, upload: float = 0.0):
+        self.latency = latency          # искусственная задержка ответа, с
+        self.handshake = handshake      # задержка первого запроса по новому соединению, с
+        self.upload = upload            # задержка на каждый файл, отправленный по URL, с
+        self.connections = set()        # адреса клиентов, уже «прошедших рукопожатие»
+        self.calls = []                 # (время получения, method, параметры)
+        self.uploads = 0                # файлов, загруженных по URL
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._files = {}                # file_id -> file_unique_id
+        self._runner = None
+        self.url = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def session(self, **kwargs) -> TunedAiohttpSession:
+        return TunedAiohttpSession(api=TelegramAPIServer.from_base(self.url), **kwargs)
+
+    def calls_by_method(self, method: str):
+        return [c for c in self.calls if c[1] == method]
+
+    async def _handle(self, request: web.Request):
+        received = time.time()
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls.append((received, method, params))
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if self.handshake and peer not in self.connections:
+            self.connections.add(peer)
+            await asyncio.sleep(self.handshake)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        media = self._media(method, params)
+        uploads = sum(ref.startswith(("http://", "https://")) for _, ref in media)
+        if uploads:
+            self.uploads += uploads
+            await asyncio.sleep(self.upload * uploads)
+        return web.json_response({"ok": True, "result": self._result(method, params, media)})
+
+    @staticmethod
+    def _media(method: str, params: dict) -> list:
+        # [(тип, file_id или URL)] — файлы запроса
+        if method == "sendMediaGroup":
+            return [(m["type"], m["media"]) for m in json.loads(params["media"])]
+        for kind in ("photo", "video", "document"):
+            if kind in params:
+                return [(kind, params[kind])]
+        return []
+
+    def _file(self, ref: str) -> dict:
+        # По URL — новый file_id (как у Telegram после загрузки), содержимое определяется адресом
+        if ref.startswith(("http://", "https://")):
+            file_id = f"file_{next(self._file_ids)}"
+            self._files[file_id] = f"unique_{ref.rsplit('/', 1)[-1]}"
+        else:
+            file_id = ref
+        return {"file_id": file_id, "file_unique_id": self._files.setdefault(file_id, f"unique_{file_id}")}
+
+    def _result(self, method: str, params: dict, media: list):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench"}
+        if method == "copyMessage":
+            return {"message_id": next(self._message_ids)}
+        if method == "copyMessages":
+            return [{"message_id": next(self._message_ids)} for _ in json.loads(params["message_ids"])]
+        if method.startswith("send"):
+            chat_id = int(params.get("chat_id", 0))
+            messages = []
+            for kind, ref in media or [(None, None)]:
+                message = {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "channel" if chat_id < 0 else "private"},
+                }
+                if "text" in params:
+                    message["text"] = params["text"]
+                if "caption" in params:
+                    message["caption"] = params["caption"]
+                if kind == "photo":
+                    message["photo"] = [dict(self._file(ref), width=1280, height=720)]
+                elif kind == "video":
+                    message["video"] = dict(self._file(ref), width=1280, height=720, duration=10)
+                elif kind == "document":
+                    message["document"] = self._file(ref)
+                messages.append(message)
+            return messages if method == "sendMediaGroup" else messages[0]
+        return True
@@ -0,0 +1,145 @@
+# Проверка работы нескольких экземпляров: три процесса бота работают с общими
+# хранилищем и файлом координации, отправляя в локальную заглушку Bot API.
+# Посты добавляются в хранилище уже после запуска экземпляров (они доходят до
+# лидера через журнал изменений), посередине расписания лидер убивается
+# (SIGKILL). В конце проверяется, что каждый пост отправлен ровно один раз,
+# и выводится время смены лидера.
+#
+# Единственное окно для дубля — SIGKILL между получением запроса Bot API и
+# отметкой claim как выполненного; при интервале постов 0.2 с оно почти не
+# встречается.
+#
+#   python benchmarks/multi_instance_check.py [--posts 60] [--replicas 3]
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+LEASE_TTL = 3.0
+CLAIM_TTL = 5.0
+
+
+async def run_child(api_url: str):
+    import main
+    from aiogram.client.telegram import TelegramAPIServer
+    from connection_pool import TunedAiohttpSession
+    from coordination import Coordinator, SQLiteLockBackend
+    from fake_api import bench_config
+    from publisher import Publisher
+
+    logging.getLogger().setLevel(logging.WARNING)
+    main.create_app(bench_config(coordination_path="coordination.db", sync_interval=0.5))
+    main.bot.session = TunedAiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    main.publisher = Publisher(global_rate=1000, chat_rate=1000, chat_burst=1000)
+    main.coordinator = Coordinator(SQLiteLockBackend("coordination.db"), lease_ttl=LEASE_TTL, claim_ttl=CLAIM_TTL)
+    await main.on_startup(main.bot)
+    open(f"ready_{os.getpid()}", "w").close()
+    await asyncio.Event().wait()
+
+
+def populate(n: int, start: datetime, spacing: float):
+    from post_model import Post
+    from post_store import SQLitePostStore
+
+    store = SQLitePostStore("scheduled_posts.db")
+    posts = [
+        Post(f"check_{i}", 1, start + timedelta(seconds=i * spacing), f"check_{i}")
+        for i in range(n)
+    ]
+    store.upsert_many(posts)
+    store.close()
+
+
+def current_leader():
+    try:
+        conn = sqlite3.connect("coordination.db", timeout=5)
+        row = conn.execute("SELECT owner, expires FROM leases WHERE name = 'scheduler'").fetchone()
+        conn.close()
+    except sqlite3.Error:
+        return None
+    if row and row[1] > time.time():
+        return row[0]
+    return None
+
+
+async def run_parent(args):
+    from fake_api import FakeTelegramAPI
+
+    api = await FakeTelegramAPI().start()
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", api.url])
+        for _ in range(args.replicas)
+    ]
+    by_pid = {p.pid: p for p in children}
+
+    try:
+        while not all(os.path.exists(f"ready_{p.pid}") for p in children):
+            await asyncio.sleep(0.2)
+        print(f"Запущено экземпляров: {len(children)}, лидер: {current_leader()}")
+
+        start = datetime.now() + timedelta(seconds=2)
+        populate(args.posts, start, args.spacing)
+
+        end = start + timedelta(seconds=args.posts * args.spacing)
+        kill_at = start + timedelta(seconds=args.posts * args.spacing / 2)
+        killed_at = None
+        failover = None
+        old_leader = None
+        while datetime.now() < end + timedelta(seconds=CLAIM_TTL + 5):
+            leader = current_leader()
+            if killed_at is None and datetime.now() >= kill_at and leader:
+                old_leader = leader
+                pid = int(leader.split(":")[1])
+                print(f"Убиваем лидера {leader}")
+                by_pid[pid].send_signal(signal.SIGKILL)
+                killed_at = time.monotonic()
+            elif killed_at is not None and failover is None and leader and leader != old_leader:
+                failover = time.monotonic() - killed_at
+                print(f"Новый лидер {leader} через {failover:.1f} с")
+            await asyncio.sleep(0.1)
+    finally:
+        for p in children:
+            if p.poll() is None:
+                p.kill()
+        await api.stop()
+
+    sent = Counter(params.get("text") for _, method, params in api.calls if method == "sendMessage")
+    expected = {f"check_{i}" for i in range(args.posts)}
+    duplicates = {t: n for t, n in sent.items() if n > 1}
+    missing = expected - set(sent)
+    print(f"Постов: {args.posts}, отправлено: {sum(sent.values())}, "
+          f"дубликатов: {len(duplicates)}, не отправлено: {len(missing)}")
+    if duplicates or missing:
+        print(f"ОШИБКА: дубликаты {sorted(duplicates)}, пропущены {sorted(missing)}")
+        sys.exit(1)
+    print("OK: каждый пост отправлен ровно один раз")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", metavar="API_URL")
+    parser.add_argument("--posts", type=int, default=60)
+    parser.add_argument("--spacing", type=float, default=0.2, help="интервал между постами, с")
+    parser.add_argument("--replicas", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_child(args.child))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            asyncio.run(run_parent(args))
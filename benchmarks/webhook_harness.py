@@ -0,0 +1,112 @@
+# Локальный стенд для webhook-режима: поднимает aiohttp-приложение из main,
+# отправляет синтетические апдейты POST-запросами с секретным заголовком и
+# измеряет задержку «апдейт -> обработчик отработал». Вызовы Bot API
+# перехватываются заглушкой сессии, Telegram не нужен.
+#
+#   python benchmarks/webhook_harness.py [--updates 500]
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Chat, Message  # noqa: E402
+from aiohttp import ClientSession, web  # noqa: E402
+
+from fake_api import percentiles  # noqa: E402
+
+SECRET = "harness-secret"
+
+
+class StubSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if method.__returning__ is Message:
+            return Message(
+                message_id=self.calls.total(),
+                date=datetime.now(),
+                chat=Chat(id=getattr(method, "chat_id", 0) or 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def start_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def run(n: int):
+    import main
+    from fake_api import bench_config
+
+    main.create_app(bench_config())
+    stub = StubSession()
+    main.bot.session = stub
+    app = main.create_webhook_app(SECRET, handle_in_background=False)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{main.config.webhook_path}"
+
+    admin_id = main.config.admin_ids[0]
+    latencies = []
+    async with ClientSession() as http:
+        async with http.post(url, json=start_update(0, admin_id)) as resp:
+            print(f"Без секрета: HTTP {resp.status}")
+
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        for i in range(1, n + 1):
+            t0 = time.perf_counter()
+            async with http.post(url, json=start_update(i, admin_id), headers=headers) as resp:
+                await resp.read()
+                assert resp.status == 200, resp.status
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await runner.cleanup()
+
+    print(f"Апдейтов: {n}, вызовов Bot API: {dict(stub.calls)}")
+    print(
+        f"Задержка: {percentiles(latencies)}, среднее {statistics.mean(latencies):.2f} мс"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=500, help="синтетических апдейтов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(args.updates))
@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from payloads import MEDIA_TYPES, check_album, check_content
+from recurrence import parse_repeat
+from validation import parse_buttons, parse_datetime, parse_date, parse_time_on, check_future
+
+
+# ─── Массовый импорт постов из CSV / JSON ───
+# Файл разбирается построчно (CSV, JSON Lines) или целиком (массив JSON);
+# каждая запись проверяется по тем же правилам, что и PostForm. Ошибки не
+# прерывают импорт — они собираются в отчёт с номерами строк.
+#
+# Поля записи:
+#   text        — текст поста (HTML), обязателен
+#   datetime    — "ДД.ММ.ГГГГ ЧЧ:ММ" (или отдельные date "ДД.ММ.ГГГГ" и time "ЧЧ:ММ")
+#   media_type  — photo / video / document / album, необязательно
+#   media_id    — file_id или URL медиа, обязателен вместе с media_type (кроме album)
+#   album       — для media_type album: строки "тип file_id-или-URL", через перевод
+#                 строки (в JSON можно списком строк или объектов {"type", "id"})
+#   buttons     — строки "Текст | https://ссылка", через перевод строки
+#                 (в JSON можно списком)
+#   targets     — ID каналов через запятую (в JSON можно списком); по умолчанию все
+#   repeat      — правило повтора: ежедневно, еженедельно, "каждые 6 ч", crontab
+
+MAX_ROWS = 10_000
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = []          # (номер строки, проверенные поля)
+        self.errors = []        # (номер строки, текст ошибки)
+
+    def summary(self, limit: int = 30) -> str:
+        lines = [f"Импортировано: {len(self.rows)}, с ошибками: {len(self.errors)}"]
+        for row, error in self.errors[:limit]:
+            lines.append(f"строка {row}: {error}".replace("\n", " "))
+        if len(self.errors) > limit:
+            lines.append(f"… и ещё {len(self.errors) - limit}")
+        return "\n".join(lines)
+
+    def error_log(self) -> str:
+        return "".join(f"{row}\t{error}".replace("\n", " ") + "\n" for row, error in self.errors)
+
+
+def iter_records(raw: bytes, filename: str):
+    # -> (номер строки, запись или исключение разбора)
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig", newline=""))
+        # нумерация как в табличном редакторе: заголовок — строка 1
+        yield from enumerate(reader, 2)
+    elif name.endswith((".jsonl", ".ndjson")):
+        for number, line in enumerate(io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig"), 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"некорректный JSON: {e}")
+    elif name.endswith(".json"):
+        records = json.loads(raw.decode("utf-8-sig"))
+        if not isinstance(records, list):
+            raise ValueError("Ожидается массив объектов JSON")
+        yield from enumerate(records, 1)
+    else:
+        raise ValueError("Поддерживаются файлы .csv, .json и .jsonl")
+
+
+def _field(record: dict, name: str) -> str:
+    value = record.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def _album(value) -> list:
+    if isinstance(value, str):
+        value = value.splitlines()
+    items = []
+    for entry in value if isinstance(value, list) else ():
+        if isinstance(entry, dict):
+            items.append({"type": str(entry.get("type", "")).strip().lower(), "id": str(entry.get("id", "")).strip()})
+        elif str(entry).strip():
+            media_type, _, ref = str(entry).strip().partition(" ")
+            items.append({"type": media_type.lower(), "id": ref.strip()})
+    check_album(items)
+    return items
+
+
+def validate_record(record: dict, channels, now: datetime = None) -> dict:
+    if not isinstance(record, dict):
+        raise ValueError("запись должна быть объектом")
+
+    text = _field(record, "text")
+    if not text:
+        raise ValueError("Текст не может быть пустым.")
+
+    if _field(record, "datetime"):
+        when = parse_datetime(_field(record, "datetime"))
+    else:
+        when = parse_time_on(parse_date(_field(record, "date")), _field(record, "time"))
+    check_future(when, now)
+
+    media_type = _field(record, "media_type").lower() or None
+    media_id = _field(record, "media_id") or None
+    album = None
+    if media_type == "album":
+        album = _album(record.get("album"))
+        media_id = None
+    elif media_type and media_type not in MEDIA_TYPES:
+        raise ValueError(f"media_type должен быть одним из: {', '.join(MEDIA_TYPES + ('album',))}")
+    elif bool(media_type) != bool(media_id):
+        raise ValueError("media_type и media_id указываются вместе")
+
+    buttons = record.get("buttons")
+    if isinstance(buttons, list):
+        buttons = "\n".join(map(str, buttons))
+    buttons = parse_buttons(buttons) if buttons and str(buttons).strip() else None
+
+    targets = record.get("targets")
+    if isinstance(targets, str):
+        targets = [t for t in targets.replace(";", ",").split(",") if t.strip()]
+    if targets:
+        try:
+            targets = [int(t) for t in targets]
+        except (TypeError, ValueError):
+            raise ValueError("targets: ожидаются ID каналов") from None
+        unknown = [t for t in targets if t not in channels]
+        if unknown:
+            raise ValueError(f"неизвестные каналы: {', '.join(map(str, unknown))}")
+        targets = [c for c in channels if c in targets]
+    else:
+        targets = list(channels)
+
+    repeat = parse_repeat(_field(record, "repeat"), when) if _field(record, "repeat") else None
+    check_content(text, media_type, buttons)
+
+    return {
+        "text": text,
+        "when": when,
+        "media_type": media_type,
+        "media_id": media_id,
+        "album": album,
+        "buttons": buttons,
+        "targets": targets,
+        "repeat": repeat,
+    }
+
+
+def parse_import(raw: bytes, filename: str, channels, now: datetime = None) -> ImportReport:
+    report = ImportReport()
+    now = now or datetime.now()
+    seen = 0
+    for number, record in iter_records(raw, filename):
+        seen += 1
+        if seen > MAX_ROWS:
+            report.errors.append((number, f"превышен лимит {MAX_ROWS} записей, остаток пропущен"))
+            break
+        try:
+            if isinstance(record, Exception):
+                raise record
+            report.rows.append((number, validate_record(record, channels, now)))
+        except ValueError as e:
+            report.errors.append((number, str(e)))
+    return report
@@ -0,0 +1,70 @@
+import inspect
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery
+
+
+# ─── Маршрутизация callback-кнопок ───
+# callback_data имеет вид "<action>" или "<action>:<arg>". Обработчик ищется
+# одним обращением к словарю по action, поэтому порядок регистрации не важен
+# и короткие префиксы не перекрывают длинные.
+
+SEPARATOR = ":"
+
+
+def pack(action: str, arg="") -> str:
+    return f"{action}{SEPARATOR}{arg}" if arg != "" else action
+
+
+def unpack(data: str):
+    action, _, arg = (data or "").partition(SEPARATOR)
+    return action, arg
+
+
+class CallbackRouter:
+    def __init__(self):
+        self._routes = {}       # action -> (handler, state, имена параметров)
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, action: str):
+        return action in self._routes
+
+    def action(self, name: str, state: State = None):
+        # Регистрирует обработчик для action; state — требуемое состояние FSM.
+        # Обработчик получает callback первым аргументом, а также state и arg,
+        # если объявляет такие параметры.
+        if SEPARATOR in name:
+            raise ValueError(f"Недопустимое имя action: {name}")
+
+        def decorator(handler):
+            if name in self._routes:
+                raise ValueError(f"action {name} уже зарегистрирован")
+            params = set(inspect.signature(handler).parameters)
+            self._routes[name] = (handler, state, params)
+            return handler
+        return decorator
+
+    def resolve(self, data: str):
+        action, arg = unpack(data)
+        return self._routes.get(action), arg
+
+    async def dispatch(self, callback: CallbackQuery, state: FSMContext):
+        route, arg = self.resolve(callback.data)
+        if route is None:
+            await callback.answer("Кнопка устарела, откройте меню заново.", show_alert=True)
+            return
+
+        handler, required_state, params = route
+        if required_state is not None and await state.get_state() != required_state.state:
+            await callback.answer()
+            return
+
+        kwargs = {}
+        if "state" in params:
+            kwargs["state"] = state
+        if "arg" in params:
+            kwargs["arg"] = arg
+        await handler(callback, **kwargs)
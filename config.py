@@ -0,0 +1,151 @@
+import os
+import typing
+from dataclasses import dataclass, field, fields
+from datetime import timedelta
+
+
+# ─── Настройки ───
+# Все настройки бота в одном месте. Config.from_env() читает их из
+# переменных окружения: имя переменной — имя поля в верхнем регистре
+# (BOT_TOKEN, ADMIN_IDS, POST_SPACING, ...). Обязательны BOT_TOKEN, ADMIN_IDS
+# и CHANNEL_ID (или CHANNELS); остальное берётся по умолчанию.
+#
+# Форматы значений:
+#   числа и строки — как есть; пустая строка у необязательных полей — None
+#   интервалы (timedelta) — в секундах: POST_SPACING=90
+#   списки — через запятую: ADMIN_IDS=111,222; OUTBOX_RETRY_SCHEDULE=60,300
+#   CHANNELS — «ID=название» через точку с запятой: -1001=Новости;-1002=Архив
+#   CHANNEL_SPACING — «ID=секунды» через запятую: -1001=300,-1002=60
+
+
+def _ids(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _channels(value: str) -> dict:
+    channels = {}
+    for item in value.split(";"):
+        if item.strip():
+            chat_id, _, name = item.partition("=")
+            channels[int(chat_id)] = name.strip() or chat_id.strip()
+    return channels
+
+
+def _spacing(value: str) -> dict:
+    spacing = {}
+    for item in value.split(","):
+        if item.strip():
+            chat_id, _, seconds = item.partition("=")
+            spacing[int(chat_id)] = timedelta(seconds=float(seconds))
+    return spacing
+
+
+def _seconds(value: str) -> timedelta:
+    return timedelta(seconds=float(value))
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on", "да")
+
+
+_PARSERS = {
+    int: int, float: float, str: str, bool: _flag, timedelta: _seconds,
+    list: _ids, tuple: lambda value: tuple(_ids(value)),
+}
+
+
+@dataclass(slots=True)
+class Config:
+    bot_token: str
+    admin_ids: list = field(metadata={"parse": _ids})
+    channels: dict = field(metadata={"parse": _channels})     # все каналы для публикации: ID -> название
+
+    run_mode: str = "polling"                               # "polling" или "webhook"
+    webhook_base_url: str = "https://example.com"           # публичный адрес (балансировщик/прокси)
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""                                # пусто — генерируется при запуске
+    webhook_listen_host: str = "0.0.0.0"
+    webhook_listen_port: int = 8080
+
+    coordination_path: str | None = None                    # общий SQLite для нескольких экземпляров; None — один экземпляр
+    sync_interval: float = 1.0                              # как часто подтягивать изменения других экземпляров, с
+
+    bot_pool_size: int = 100                                # одновременных соединений с Bot API
+    bot_keepalive: float = 75.0                             # сколько держать простаивающее соединение, с
+    bot_request_timeout: float = 60.0                       # таймаут запроса к Bot API, с
+    bot_dns_ttl: int = 3600                                 # кэш DNS, с
+    prewarm_lead: timedelta | None = timedelta(seconds=5)   # за сколько до волны публикаций прогревать соединения; None — не прогревать
+    prewarm_window: timedelta = timedelta(seconds=2)        # срабатывания в этом окне считаются одной волной
+
+    update_concurrency: int = 32                            # обработчиков одновременно (по разным чатам)
+    update_chat_queue: int = 10                             # апдейтов в очереди одного чата, дальше — отказ
+    update_max_pending: int = 500                           # апдейтов в очередях всего, дальше — отказ
+    duplicate_callback_window: float = 1.0                  # повторное нажатие той же кнопки в этом окне отбрасывается, с
+    album_wait: float = 1.0                                 # альбом считается собранным, если столько нет новых файлов, с
+
+    metrics_listen_host: str = "127.0.0.1"
+    metrics_listen_port: int | None = 9101                  # None — не поднимать /metrics
+
+    scheduled_posts_file: str = "scheduled_posts.json"      # старый формат, только для миграции
+    post_store_backend: str = "sqlite"                      # "sqlite" или "journal"
+    post_store_path: str = "scheduled_posts.db"
+    store_flush_window: float = 0.05                        # изменения за это окно пишутся одним пакетом, с
+    store_changes_keep: timedelta = timedelta(hours=1)      # сколько хранить журнал изменений для других экземпляров
+    load_chunk: int = 2000                                  # постов за один шаг фоновой загрузки очереди
+    file_cache_size: int = 10_000                           # сколько загруженных файлов помнить для отправки по file_id; 0 — не помнить
+    outbox_path: str = "outbox.db"                          # журнал отправок; при нескольких экземплярах — общий файл
+    outbox_retry_schedule: tuple = (60, 300, 1800, 7200)    # паузы перед повторами неудачной отправки, с
+    outbox_retry_tick: int = 30                             # как часто проверять повторы, с
+    outbox_retry_batch: int = 50                            # повторов за один проход
+    outbox_keep: timedelta = timedelta(days=30)             # сколько помнить message_id опубликованных постов
+    post_spacing: timedelta = timedelta(minutes=1)          # минимум между постами одного канала; 0 — без ограничения
+    channel_spacing: dict = field(default_factory=dict, metadata={"parse": _spacing})  # свой минимум для каналов: ID -> timedelta
+    job_horizon: timedelta = timedelta(hours=6)             # задачи в планировщике создаются только на это окно вперёд
+    misfire_policy: str = "coalesce"                        # пропущенные запуски: "late" — опубликовать все с опозданием,
+                                                            # "coalesce" — серию догнать одной публикацией, "drop" — пропустить
+    misfire_grace: timedelta = timedelta(minutes=5)         # опоздание в этих пределах не считается пропуском
+    catchup_batch: int = 10                                 # просроченные посты запускаются пачками...
+    catchup_step: timedelta = timedelta(seconds=2)          # ...с таким шагом
+    misfire_report_size: int = 200                          # сколько опозданий помнить для /late
+    fsm_storage_path: str = "fsm.db"
+    fsm_draft_ttl: timedelta = timedelta(days=3)            # брошенные черновики удаляются после этого срока
+    fsm_max_cached: int = 500                               # сколько черновиков держать в памяти
+
+    def __post_init__(self):
+        # Экземпляр читает чужие изменения раз в sync_interval: журнал должен
+        # пережить много таких проходов, иначе изменение удалится непрочитанным
+        if self.store_changes_keep.total_seconds() < 60 * self.sync_interval:
+            raise ValueError("STORE_CHANGES_KEEP должен быть не меньше 60 * SYNC_INTERVAL")
+        # Журнал (JSON Lines) читается только своим процессом: правок и
+        # удалений других экземпляров он не видит
+        if self.coordination_path and self.post_store_backend == "journal":
+            raise ValueError("POST_STORE_BACKEND=journal не работает с COORDINATION_PATH — используйте sqlite")
+
+    @classmethod
+    def from_env(cls, environ=None) -> "Config":
+        environ = os.environ if environ is None else environ
+        values = {}
+        for f in fields(cls):
+            raw = environ.get(f.name.upper())
+            if raw is None:
+                continue
+            types = typing.get_args(f.type) or (f.type,)
+            if raw.strip() == "" and type(None) in types:
+                values[f.name] = None
+                continue
+            parse = f.metadata.get("parse") or _PARSERS[next(t for t in types if t is not type(None))]
+            try:
+                values[f.name] = parse(raw)
+            except ValueError:
+                raise ValueError(f"Неверное значение {f.name.upper()}: {raw!r}") from None
+
+        # Один канал можно задать коротко: CHANNEL_ID (и CHANNEL_NAME)
+        if "channels" not in values and environ.get("CHANNEL_ID"):
+            channel_id = int(environ["CHANNEL_ID"])
+            values["channels"] = {channel_id: environ.get("CHANNEL_NAME", "Основной канал")}
+
+        names = {"bot_token": "BOT_TOKEN", "admin_ids": "ADMIN_IDS", "channels": "CHANNEL_ID (или CHANNELS)"}
+        missing = [env for name, env in names.items() if not values.get(name)]
+        if missing:
+            raise ValueError(f"Не заданы переменные окружения: {', '.join(missing)}")
+        return cls(**values)
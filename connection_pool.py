@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from aiogram import __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import GetMe
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+
+# ─── Соединения с Bot API ───
+# Пул соединений бота настраивается явно: размер, сколько держать простаивающее
+# соединение (keep-alive), таймаут запроса, кэш DNS. Пост, срабатывающий после
+# долгого простоя, иначе платит за DNS, TCP и TLS прямо в момент публикации.
+#
+# ConnectionWarmer заранее смотрит на ближайшее срабатывание и за lead секунд
+# до волны отправок открывает (или освежает) столько соединений, сколько
+# отправок пойдёт параллельно: несколько одновременных getMe оставляют в пуле
+# готовые соединения, и публикация идёт по ним.
+#
+# Какие запросы открывали новое соединение, видно через track_connection():
+# по нему publish_lag делится на cold и warm.
+
+_connection_use = contextvars.ContextVar("connection_use", default=None)
+
+
+class ConnectionUse:
+    __slots__ = ("fresh",)
+
+    def __init__(self):
+        self.fresh = False      # запрос открыл новое соединение
+
+    @property
+    def label(self) -> str:
+        return "cold" if self.fresh else "warm"
+
+
+@contextmanager
+def track_connection():
+    # Отмечает, открывали ли запросы внутри блока новое соединение.
+    # Работает только с TunedAiohttpSession; с другими сессиями fresh остаётся False
+    use = ConnectionUse()
+    token = _connection_use.set(use)
+    try:
+        yield use
+    finally:
+        _connection_use.reset(token)
+
+
+class TunedAiohttpSession(AiohttpSession):
+    def __init__(self, limit: int = 100, keepalive: float = 75.0, timeout: float = 60.0,
+                 dns_ttl: int = 3600, **kwargs):
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(keepalive_timeout=keepalive, ttl_dns_cache=dns_ttl)
+        self.opened = 0         # новых соединений за всё время
+        self.reused = 0         # запросов по уже открытому соединению
+
+    async def create_session(self) -> ClientSession:
+        # То же, что в AiohttpSession, плюс TraceConfig для учёта соединений
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            trace = TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection_created)
+            trace.on_connection_reuseconn.append(self._on_connection_reused)
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[trace],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def _on_connection_created(self, session, ctx, params):
+        self.opened += 1
+        use = _connection_use.get()
+        if use is not None:
+            use.fresh = True
+
+    async def _on_connection_reused(self, session, ctx, params):
+        self.reused += 1
+
+
+class ConnectionWarmer:
+    # next_burst(now) -> (время ближайшего срабатывания, число отправок в волне) или None
+
+    def __init__(self, bot, next_burst, lead: float = 5.0, max_connections: int = 10, tick: float = 1.0):
+        self.bot = bot
+        self.next_burst = next_burst
+        self.lead = lead
+        self.max_connections = max_connections
+        self.tick = tick
+        self.warmups = 0
+        self._warmed = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check(datetime.now())
+            except Exception as e:
+                logging.error(f"Ошибка прогрева соединений: {e}")
+            await asyncio.sleep(self.tick)
+
+    async def check(self, now: datetime):
+        burst = self.next_burst(now)
+        if burst is None:
+            return
+        fire, sends = burst
+        if fire == self._warmed or (fire - now).total_seconds() > self.lead:
+            return
+        self._warmed = fire
+        await self.warm(min(sends, self.max_connections))
+
+    async def warm(self, connections: int):
+        # Одновременные запросы не могут делить соединение — каждый занимает своё
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(self.bot(GetMe()) for _ in range(connections)), return_exceptions=True)
+        failed = sum(isinstance(r, Exception) for r in results)
+        self.warmups += 1
+        logging.debug(f"Прогрев: {connections} соединений за {(time.perf_counter() - t0) * 1000:.0f} мс, ошибок {failed}")
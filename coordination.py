@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+
+# ─── Координация нескольких экземпляров бота ───
+# Лидер (владелец lease "scheduler") ставит задачи публикации; остальные
+# экземпляры обслуживают админские обработчики. Перед отправкой каждый пост
+# «захватывается» (claim) — даже если два экземпляра на мгновение считают себя
+# лидерами, отправит только тот, кто захватил пост. Отправленный пост помечается
+# done и больше не захватывается.
+
+
+class LockBackend:
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        # Захватить или продлить lease; True — владелец owner
+        raise NotImplementedError
+
+    def release(self, name: str, owner: str):
+        raise NotImplementedError
+
+    def claim(self, job_id: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def complete(self, job_id: str, owner: str):
+        raise NotImplementedError
+
+    def unclaim(self, job_id: str, owner: str):
+        raise NotImplementedError
+
+    def is_done(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def prune(self, older_than: float):
+        pass
+
+
+class SQLiteLockBackend(LockBackend):
+    # Общий файл SQLite (один хост или общий том). Все проверки и записи
+    # выполняются в одной транзакции BEGIN IMMEDIATE, поэтому атомарны между процессами.
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name    TEXT PRIMARY KEY,
+                owner   TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS claims (
+                job_id  TEXT PRIMARY KEY,
+                owner   TEXT NOT NULL,
+                expires REAL NOT NULL,
+                done    INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+
+    def _tx(self, sql: str, params) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rowcount = self._conn.execute(sql, params).rowcount
+                self._conn.execute("COMMIT")
+                return rowcount
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        return self._tx(
+            "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+            (name, owner, now + ttl, now),
+        ) > 0
+
+    def release(self, name: str, owner: str):
+        self._tx("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def claim(self, job_id: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        return self._tx(
+            "INSERT INTO claims (job_id, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(job_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE claims.done = 0 AND claims.expires < ?",
+            (job_id, owner, now + ttl, now),
+        ) > 0
+
+    def complete(self, job_id: str, owner: str):
+        self._tx("UPDATE claims SET done = 1 WHERE job_id = ? AND owner = ?", (job_id, owner))
+
+    def unclaim(self, job_id: str, owner: str):
+        self._tx("DELETE FROM claims WHERE job_id = ? AND owner = ? AND done = 0", (job_id, owner))
+
+    def is_done(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT done FROM claims WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def prune(self, older_than: float):
+        self._tx("DELETE FROM claims WHERE expires < ?", (older_than,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Coordinator:
+    # backend=None — единственный экземпляр: всегда лидер, claim всегда успешен
+
+    def __init__(self, backend: LockBackend = None, lease_ttl: float = 6.0, claim_ttl: float = 120.0):
+        self.backend = backend
+        self.lease_ttl = lease_ttl
+        self.claim_ttl = claim_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = backend is None
+        self.on_elected = None
+        self.on_demoted = None
+        self._task = None
+
+    def _try_acquire(self) -> bool:
+        try:
+            return self.backend.acquire("scheduler", self.owner, self.lease_ttl)
+        except Exception as e:
+            logging.error(f"Ошибка продления lease: {e}")
+            return False
+
+    async def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        logging.info(f"Экземпляр {self.owner}: {'стал лидером' if leader else 'больше не лидер'}")
+        callback = self.on_elected if leader else self.on_demoted
+        if callback:
+            await callback()
+
+    async def start(self, on_elected=None, on_demoted=None):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        if self.backend is None:
+            if on_elected:
+                await on_elected()
+            return
+        await self._set_leader(await asyncio.to_thread(self._try_acquire))
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # Продление в три раза чаще TTL: смена лидера занимает не больше lease_ttl
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            # Запрос к общему SQLite может ждать блокировку (busy timeout) — не в цикле событий
+            await self._set_leader(await asyncio.to_thread(self._try_acquire))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None and self.is_leader:
+            await asyncio.to_thread(self.backend.release, "scheduler", self.owner)
+            self.is_leader = False
+
+    def claim(self, job_id: str) -> bool:
+        if self.backend is None:
+            return True
+        return self.backend.claim(job_id, self.owner, self.claim_ttl)
+
+    def complete(self, job_id: str):
+        if self.backend is not None:
+            self.backend.complete(job_id, self.owner)
+
+    def unclaim(self, job_id: str):
+        if self.backend is not None:
+            self.backend.unclaim(job_id, self.owner)
+
+    def completed(self, job_id: str) -> bool:
+        return self.backend is not None and self.backend.is_done(job_id)
+
+    def prune(self, keep: float = 7 * 24 * 3600):
+        if self.backend is not None:
+            self.backend.prune(time.time() - keep)
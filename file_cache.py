@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+
+# ─── Кэш file_id ───
+# Медиа поста задаётся file_id (пришло от админа) или URL (из импорта).
+# По URL Telegram скачивает и загружает файл заново при каждой отправке, а
+# у одного и того же файла, присланного админом дважды, разные file_id.
+# Кэш сводит всё к содержимому: file_unique_id -> file_id, которым файл уже
+# лежит на серверах Telegram, и ссылки (URL или file_id) -> file_unique_id.
+# Ссылки узнаются из ответов на отправку и из сообщений админа, поэтому
+# файл загружается один раз, сколько бы постов и каналов его ни использовали.
+#
+# Кэш живёт в памяти и ограничен max_size содержимым (вытесняется самое
+# давнее); после перезапуска URL загрузится ещё раз — и снова попадёт в кэш.
+
+
+def message_files(sent) -> list:
+    # (file_id, file_unique_id) медиа отправленного сообщения или альбома
+    files = []
+    for message in sent if isinstance(sent, list) else (sent,):
+        media = message.photo[-1] if message.photo else message.video or message.document
+        files.append((media.file_id, media.file_unique_id) if media else None)
+    return files
+
+
+class FileCache:
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._files = OrderedDict()     # file_unique_id -> file_id
+        self._refs = {}                 # URL или file_id -> file_unique_id
+        self._aliases = {}              # file_unique_id -> [ссылки] — чтобы вытеснять вместе с содержимым
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._files)
+
+    def resolve(self, ref: str) -> str:
+        # file_id, под которым файл уже загружен, или сама ссылка
+        unique_id = self._refs.get(ref)
+        file_id = self._files.get(unique_id) if unique_id else None
+        if file_id is None:
+            self.misses += 1
+            return ref
+        self.hits += 1
+        self._files.move_to_end(unique_id)
+        return file_id
+
+    def remember(self, ref: str, file_id: str, unique_id: str) -> str:
+        # Первый узнанный file_id содержимого остаётся основным: его и
+        # возвращает resolve для всех ссылок на то же содержимое
+        known = self._files.get(unique_id)
+        if known is None:
+            known = self._files[unique_id] = file_id
+            self._aliases[unique_id] = []
+        for alias in (ref, file_id):
+            if self._refs.get(alias) != unique_id:
+                self._refs[alias] = unique_id
+                self._aliases[unique_id].append(alias)
+        if len(self._files) > self.max_size:
+            dropped, _ = self._files.popitem(last=False)
+            for alias in self._aliases.pop(dropped):
+                if self._refs.get(alias) == dropped:
+                    del self._refs[alias]
+        return known
+
+    def learn(self, refs, sent):
+        # refs — ссылки на медиа в порядке отправки, sent — ответ Bot API
+        for ref, found in zip(refs, message_files(sent)):
+            if found:
+                self.remember(ref, *found)
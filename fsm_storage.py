@@ -0,0 +1,132 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+
+# ─── Хранилище FSM на SQLite ───
+# Черновики PostForm/EditForm переживают перезапуск. В памяти держится только
+# LRU-кэш из max_cached ключей, записи старше ttl считаются брошенными и
+# удаляются (при чтении и периодическим purge_expired).
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    raise TypeError(f"Не сериализуется в FSM: {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        if "$dt" in obj:
+            return datetime.fromisoformat(obj["$dt"])
+        if "$d" in obj:
+            return date.fromisoformat(obj["$d"])
+    return obj
+
+
+def dump_data(data: Mapping[str, Any]) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_data(raw: str) -> dict:
+    return json.loads(raw, object_hook=_decode) if raw else {}
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_cached: int = 1000):
+        self.ttl = ttl
+        self.max_cached = max_cached
+        self._cache = OrderedDict()         # ключ -> [state, data, updated]
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key     TEXT PRIMARY KEY,
+                state   TEXT,
+                data    TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS fsm_updated ON fsm(updated);
+        """)
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = [key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.business_connection_id or "", key.destiny]
+        return ":".join(map(str, parts))
+
+    def _load(self, key: str):
+        entry = self._cache.get(key)
+        if entry is None:
+            row = self._conn.execute("SELECT state, data, updated FROM fsm WHERE key = ?", (key,)).fetchone()
+            entry = [row[0], load_data(row[1]), row[2]] if row else [None, {}, time.time()]
+        if entry[0] is None and not entry[1]:
+            self._cache.pop(key, None)
+            return entry
+        if time.time() - entry[2] > self.ttl:
+            self._drop(key)
+            return [None, {}, time.time()]
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _drop(self, key: str):
+        self._cache.pop(key, None)
+        self._conn.execute("DELETE FROM fsm WHERE key = ?", (key,))
+
+    def _save(self, key: str, state, data: dict):
+        if state is None and not data:
+            self._drop(key)
+            return
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO fsm (key, state, data, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, updated = excluded.updated",
+            (key, state, dump_data(data), now),
+        )
+        self._remember(key, [state, data, now])
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        entry = self._load(k)
+        self._save(k, state.state if isinstance(state, State) else state, entry[1])
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return self._load(self._key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k = self._key(key)
+        entry = self._load(k)
+        self._save(k, entry[0], dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict(self._load(self._key(key))[1])
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+
+    async def purge_expired(self) -> int:
+        # Корутина: планировщик выполняет её в цикле событий, в потоке
+        # соединения и обработчиков, а не в пуле потоков
+        deadline = time.time() - self.ttl
+        for k in [k for k, e in self._cache.items() if e[2] < deadline]:
+            del self._cache[k]
+        return self._conn.execute("DELETE FROM fsm WHERE updated < ?", (deadline,)).rowcount
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,71 +1,564 @@
 import asyncio
 import logging
-import json
-import os
-from datetime import datetime
+import secrets
+import time
+from collections import deque
+from dataclasses import replace
+from datetime import datetime, timedelta
 from html import escape
 
-from aiogram import Bot, Dispatcher
-from aiogram.filters import Command
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import (
     Message,
     CallbackQuery,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
+    BufferedInputFile,
 )
 
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.date import DateTrigger
 
-# ────────────────────────────────────────────────
-BOT_TOKEN = '8588881813:AAGBFM87eIDq-RcFlfqoR8yDkHhOm1JSKTw'
-CHANNEL_ID = -1003325257490                 # ← реальный ID канала
-ADMIN_IDS = [867371536]                     # ← твой ID из логов
-# ────────────────────────────────────────────────
+from callbacks import CallbackRouter, pack
+from connection_pool import TunedAiohttpSession, ConnectionWarmer, track_connection
+from config import Config
+from coordination import Coordinator, SQLiteLockBackend
+from file_cache import FileCache
+from fsm_storage import SQLiteStorage
+from metrics import MetricsRegistry, HandlerMetricsMiddleware, RequestMetricsMiddleware
+from outbox import Outbox
+from payloads import PreparedPost, check_album, check_content, sent_message_id
+from post_model import Post
+from post_registry import PostRegistry
+from publisher import Publisher
+from slots import SlotAllocator
+from post_store import open_store, migrate_from_json, WriteBehind
+from bulk_import import parse_import
+from search_index import SearchIndex, parse_query
+from recurrence import preset, reanchor, parse_repeat, make_trigger, upcoming, next_occurrence, describe
+from update_queue import ChatQueueMiddleware
+from validation import parse_buttons, parse_date, parse_time_on, parse_datetime, check_future
+
+PAGE_SIZE = 5                                       # постов на странице списка
+PREVIEW_OCCURRENCES = 5                             # сколько дат серии показывать в предпросмотре
+
+# ─── Состояние приложения ───
+# Модуль импортируется без побочных эффектов: бот, диспетчер, хранилища и
+# планировщик создаёт create_app(config), а обработчики обращаются к ним
+# как к глобальным объектам модуля.
+config = None                                       # Config
+bot = None
+dp = None
+router = Router()                                   # обработчики; диспетчеру достаётся копия (app_router)
+callbacks = CallbackRouter()
+fsm_storage = None
+update_queue = None
+scheduler = None
+publisher = None
+store = None
+store_seq = 0
+store_writer = None
+registry = None
+coordinator = None
+outbox = None
+allocator = None
+search_index = None
+file_cache = None
+warmer = None
+metrics = None
+publish_lag = None
+handler_latency = None
+store_write_time = None
+api_latency = None
+leader_since = None                                 # с какого момента этот экземпляр публикует
+
+
+def next_burst(now: datetime):
+    # Ближайшая волна публикаций для прогрева: время и число отправок в ней.
+    # Публикует только лидер — остальным экземплярам греть нечего
+    if not coordinator.is_leader:
+        return None
+    nearest = registry.next_due(1, now.isoformat())
+    if not nearest:
+        return None
+    fire = nearest[0].when
+    wave = registry.between(fire.isoformat(), (fire + config.prewarm_window).isoformat())
+    return fire, sum(len(p.targets or config.channels) for p in wave)
+
+
+def store_put(post: Post):
+    store_writer.put(post)
+
+
+def store_delete(job_id: str):
+    store_writer.delete(job_id)
+
+
+def registry_put(post: Post):
+    if post.job_id in registry:
+        registry_drop(post.job_id)
+    registry.add(post)
+    allocator.add(post)
+    search_index.add(post)
+    invalidate_pages(registry.position(post.job_id))
+
+
+def registry_drop(job_id: str):
+    invalidate_pages(registry.position(job_id))
+    registry.remove(job_id)
+    allocator.remove(job_id)
+    search_index.remove(job_id)
+    prepared.pop(job_id, None)
+
+
+def add_post(post: Post):
+    registry_put(post)
+    store_put(post)
+
+
+async def add_posts(posts: list):
+    # Одна транзакция на весь пакет в отдельном потоке; реестр обновляется
+    # только после успешной записи, ошибка доходит до вызывающего
+    with store_write_time.time("upsert_many"):
+        await asyncio.to_thread(store.upsert_many, posts)
+    for post in posts:
+        registry_put(post)
+
+
+def remove_post(job_id: str):
+    registry_drop(job_id)
+    store_delete(job_id)
+
+
+async def sync_from_store():
+    # Применяет изменения, сделанные другими экземплярами (свои изменения
+    # уже отражены в реестре и пропускаются сравнением). Запрос идёт в
+    # отдельном потоке, а реестр и задачи меняются в цикле событий
+    global store_seq
+    store_seq, changed = await asyncio.to_thread(store.changes_since, store_seq)
+    for job_id, post in changed:
+        current = registry.get(job_id)
+        if post is None:
+            if current:
+                registry_drop(job_id)
+                unschedule_post(job_id)
+            if not load_done.is_set():
+                # Пост мог ещё не дойти до фоновой загрузки — она его не вернёт
+                dropped_while_loading.add(job_id)
+        elif post != current:
+            registry_put(post)
+            schedule_post(post)
+
+
+# ─── Загрузка очереди ───
+# create_app читает из хранилища только посты до конца горизонта
+# планировщика — их нужно сразу поставить в задачи. Остальная очередь
+# дочитывается в фоне порциями по config.load_chunk, поэтому время запуска
+# не растёт вместе с очередью. Обработчики, которым нужна вся очередь
+# (список, поиск, выбор свободного времени, импорт), ждут load_done.
+load_cursor = None                  # (time_iso, job_id), после которого читать дальше; None — всё прочитано
+load_done = None                    # asyncio.Event
+load_task = None
+dropped_while_loading = set()       # удалены другим экземпляром до того, как до них дошла загрузка
+
+
+async def load_remaining():
+    global load_cursor
+    t0 = time.perf_counter()
+    loaded = 0
+    while load_cursor is not None:
+        chunk = await asyncio.to_thread(store.load_after, *load_cursor, config.load_chunk)
+        load_cursor = (chunk[-1].time_iso, chunk[-1].job_id) if len(chunk) == config.load_chunk else None
+        # Уже известные посты (свои правки, синхронизация) новее прочитанных
+        fresh = [p for p in chunk if p.job_id not in registry and p.job_id not in dropped_while_loading]
+        for post in fresh:
+            if post.text is None:
+                logging.warning(f"Пост {post.job_id} в старом формате без содержимого — удалён")
+                store_delete(post.job_id)
+                continue
+            registry.add(post)
+            allocator.add(post)
+        search_index.add_many(p for p in fresh if p.text is not None)
+        loaded += len(fresh)
+    page_cache.clear()
+    dropped_while_loading.clear()
+    load_done.set()
+    logging.info(f"Очередь загружена: {len(registry)} постов (в фоне {loaded}) за {time.perf_counter() - t0:.2f} с")
+
+
+# ─── Кэш отрисованных страниц списка ───
+# Вставка или удаление на позиции N сдвигает нумерацию всех следующих постов,
+# поэтому сбрасываются страница с этой позицией и все после неё.
+page_cache = {}     # номер страницы -> (строки постов, ряды кнопок)
+
+
+def invalidate_pages(position: int):
+    if position < 0:
+        return
+    first = position // PAGE_SIZE
+    for page in [p for p in page_cache if p >= first]:
+        del page_cache[page]
 
-SCHEDULED_POSTS_FILE = "scheduled_posts.json"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+def encode_cursor(page: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        page, r = divmod(page, 36)
+        out = digits[r] + out
+        if not page:
+            return out
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(cursor, 36)
+    except ValueError:
+        return 0
+
+
+def page_of(job_id: str) -> int:
+    return max(registry.position(job_id), 0) // PAGE_SIZE
+
+
+# ─── Медиа поста для списков и предпросмотра ───
+MEDIA_NAMES = {"photo": "фото", "video": "видео", "document": "документ"}
+
+
+def describe_media(media_type, album=None) -> str:
+    if media_type == "album":
+        return f"альбом ({len(album or ())})"
+    return MEDIA_NAMES.get(media_type, media_type)
+
+
+# ─── Готовые запросы публикации ───
+# Собираются при планировании (в пределах горизонта), поэтому кэш не растёт
+# вместе с очередью; любое изменение поста сбрасывает его запрос.
+prepared = {}       # job_id -> PreparedPost
+
+
+def prepare_post(post: Post) -> PreparedPost:
+    ready = prepared.get(post.job_id)
+    if ready is None or ready.post != post:
+        ready = prepared[post.job_id] = PreparedPost(post)
+    return ready
+
+
+async def send_prepared(ready: PreparedPost, chat_id):
+    # Файлы, уже загруженные в Telegram, уходят по file_id из кэша; из ответа
+    # кэш узнаёт file_id файлов, отправленных по ссылке
+    sent = await bot(ready.for_chat(chat_id, file_cache))
+    if ready.sources:
+        file_cache.learn(ready.sources, sent)
+    return sent
+
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
-scheduler = AsyncIOScheduler()
+# ─── Опоздавшие публикации ───
+misfires = deque()     # (job_id, время по плану, опоздание в с, итог); размер задаёт create_app
+
+
+def record_misfire(post: Post, lateness: float, outcome: str):
+    misfires.append((post.job_id, post.time_str, lateness, outcome))
+    logging.warning(f"Пост {post.job_id} ({post.time_str}): опоздание {format_lateness(lateness)}, {outcome}")
+
+
+def format_lateness(seconds: float) -> str:
+    minutes, sec = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"+{hours}:{minutes:02d}:{sec:02d}"
+
+
+def occurrence_id(post: Post) -> str:
+    # Ключ захвата: у серии — отдельный для каждого срабатывания
+    return f"{post.job_id}@{post.time_iso}" if post.repeat else post.job_id
+
+
+async def coordinated(method, *args):
+    # Claim'ы лежат в общем SQLite, и запрос может ждать чужую блокировку до
+    # busy timeout — поэтому он идёт в потоке, а не в цикле событий. У
+    # единственного экземпляра обращений к базе нет, поток не нужен
+    if coordinator.backend is None:
+        return method(*args)
+    return await asyncio.to_thread(method, *args)
+
+
+# ─── Публикация и планирование ───
+# Задача планировщика хранит только job_id: всё содержимое поста берётся из
+# записи в хранилище, поэтому задачи можно пересоздать после перезапуска.
+async def publish_post(job_id: str):
+    # При нескольких экземплярах запись читается из общего хранилища — в реестре
+    # могут ещё не быть правки, сделанные на другом экземпляре
+    post = await asyncio.to_thread(store_writer.get, job_id) if coordinator.backend else registry.get(job_id)
+    if not post:
+        logging.warning(f"Пост {job_id} не найден к моменту публикации")
+        return
+    repeat = post.repeat
+    if repeat and post.when > datetime.now() + timedelta(seconds=1):
+        # Это срабатывание серии уже обработано (запись сдвинута на следующее)
+        return
+    lateness = (datetime.now() - post.when).total_seconds()
+    missed = lateness > config.misfire_grace.total_seconds()
+    if missed and config.misfire_policy == "drop":
+        record_misfire(post, lateness, "пропущен")
+        if repeat:
+            advance_series(post)
+        else:
+            remove_post(job_id)
+        return
+
+    claim_id = occurrence_id(post)
+    if not await coordinated(coordinator.claim, claim_id):
+        if await coordinated(coordinator.completed, claim_id):
+            # Уже опубликован, но экземпляр-отправитель не успел записать
+            # удаление (или сдвиг серии) — доделываем за него
+            if repeat:
+                advance_series(post)
+            else:
+                remove_post(job_id)
+            return
+        # Пост захвачен другим экземпляром. Если тот упал до отправки, claim
+        # истечёт — тогда попробуем ещё раз (опубликованный пост к тому времени
+        # уже будет удалён из хранилища). Для серии повтор не нужен: задача
+        # сработает снова в следующий раз
+        logging.info(f"Пост {job_id} уже публикуется другим экземпляром")
+        if coordinator.is_leader and not repeat:
+            retry_at = datetime.now() + timedelta(seconds=coordinator.claim_ttl)
+            scheduler.add_job(
+                publish_post, DateTrigger(run_date=retry_at),
+                args=[job_id], id=job_id, replace_existing=True,
+            )
+        return
 
-# Загрузка сохранённых постов
-scheduled_posts = []
-if os.path.exists(SCHEDULED_POSTS_FILE):
     try:
-        with open(SCHEDULED_POSTS_FILE, "r", encoding="utf-8") as f:
-            scheduled_posts = json.load(f)
-    except Exception as e:
-        logging.error(f"Ошибка загрузки scheduled_posts.json: {e}")
-        scheduled_posts = []
+        ready = prepare_post(post)
+    except ValueError as e:
+        # Сюда попадают только записи, не прошедшие проверку при планировании
+        # (например, сохранённые до её появления) — пост остаётся в списке
+        logging.error(f"Пост {job_id} не может быть опубликован: {e}")
+        await coordinated(coordinator.unclaim, claim_id)
+        return
+
+    # Срабатывание, наступившее до того, как экземпляр стал лидером, могло быть
+    # частично отправлено прежним процессом (упал посреди публикации) — такие
+    # каналы пропускаются. Остальные срабатывания этот процесс видит впервые
+    targets = post.targets or list(config.channels)
+    if leader_since is None or post.when < leader_since:
+        delivered = await asyncio.to_thread(outbox.delivered, claim_id)
+        targets = [c for c in targets if c not in delivered]
+    fire_time = post.when.timestamp()
+
+    # Первый успешный канал получает полноценную отправку готовым запросом,
+    # остальные — копию из него (copy_message, для альбома — copy_messages)
+    # параллельно через publisher
+    results = {}
+    source = source_chat = None
+
+    async def send(chat_id):
+        with track_connection() as use:
+            return await send_prepared(ready, chat_id), use
+
+    for chat_id in targets:
+        try:
+            source, use = await publisher.submit(fire_time, chat_id, lambda c=chat_id: send(c), label=job_id)
+            publish_lag.observe(time.time() - fire_time, use.label)
+            results[chat_id] = sent_message_id(source)
+            source_chat = chat_id
+            break
+        except Exception as e:
+            logging.error(f"Ошибка публикации {job_id} в {chat_id}: {e}")
+            results[chat_id] = e
+
+    if source:
+        rest = targets[targets.index(source_chat) + 1:]
+        futures = [
+            publisher.submit(
+                fire_time, chat_id,
+                lambda c=chat_id: bot(ready.copy_for(c, source_chat, source)),
+                label=job_id,
+            )
+            for chat_id in rest
+        ]
+        for chat_id, res in zip(rest, await asyncio.gather(*futures, return_exceptions=True)):
+            if isinstance(res, Exception):
+                logging.error(f"Ошибка публикации {job_id} в {chat_id}: {res}")
+                results[chat_id] = res
+            else:
+                results[chat_id] = sent_message_id(res)
+
+    failed = [c for c, r in results.items() if isinstance(r, Exception)]
+    logging.info(f"Пост {job_id}: опубликован в {len(results) - len(failed)} из {len(targets)} каналов")
+    if missed:
+        record_misfire(post, lateness, "опубликован" if source else "ошибка публикации")
+
+    # Неудачные отправки остаются в outbox — их повторяет retry_deliveries,
+    # а срабатывание считается обработанным и уходит из очереди
+    dead = await asyncio.to_thread(outbox.record, claim_id, post, results)
+    report_dead(post, dead)
+    await coordinated(coordinator.complete, claim_id)
+    if repeat:
+        advance_series(post)
+    else:
+        remove_post(job_id)
+    return results
+
+
+# ─── Повтор неудачных отправок ───
+def report_dead(post: Post, chat_ids):
+    for chat_id in chat_ids:
+        logging.error(f"Пост {post.job_id} не отправлен в {chat_id} — перенесён в «Неотправленные»")
 
 
-def save_scheduled_posts():
+async def retry_deliveries():
+    # Повтор — полноценная отправка сохранённого в outbox поста (копировать
+    # не из чего: исходное сообщение могло не дойти ни до одного канала)
+    if not coordinator.is_leader:
+        return
+    due = await asyncio.to_thread(outbox.take_due, time.time(), config.outbox_retry_batch)
+
+    async def resend(delivery):
+        try:
+            ready = PreparedPost(delivery.post)
+            sent = await publisher.submit(
+                time.time(), delivery.chat_id, lambda: send_prepared(ready, delivery.chat_id),
+                label=delivery.occurrence,
+            )
+            result = sent_message_id(sent)
+            logging.info(f"Пост {delivery.post.job_id}: повторная отправка в {delivery.chat_id} удалась")
+        except Exception as e:
+            logging.warning(f"Повтор {delivery.post.job_id} в {delivery.chat_id} не удался: {e}")
+            result = e
+        dead = await asyncio.to_thread(outbox.record, delivery.occurrence, delivery.post, {delivery.chat_id: result})
+        report_dead(delivery.post, dead)
+
+    await asyncio.gather(*(resend(d) for d in due))
+
+
+def kick_retries():
+    job = scheduler.get_job("retry_deliveries")
+    if job:
+        job.modify(next_run_time=datetime.now())
+
+
+def advance_series(post: Post):
+    # Запись серии сдвигается на следующее срабатывание, задача перевыставляется
+    # с него же: после пропущенного запуска триггер мог уйти с сетки серии.
+    # При политике "late" следующим будет и пропущенное срабатывание — серия
+    # догоняет их по одному; иначе сразу переходит к ближайшему будущему
+    when = post.when
+    after = when if config.misfire_policy == "late" else max(when, datetime.now())
+    nxt = next_occurrence(post.repeat, when, after, scheduler.timezone)
+    unschedule_post(post.job_id)
+    if nxt is None:
+        remove_post(post.job_id)
+        return
+    post = post.retimed(nxt)
+    add_post(post)
+    # Пропущенное срабатывание — не раньше чем через шаг: текущий запуск задачи
+    # ещё не завершён, и планировщик не дал бы запустить её второй раз
+    now = datetime.now()
+    schedule_post(post, now, run_at=now + config.catchup_step if nxt <= now else None)
+
+
+def schedule_post(post: Post, now: datetime = None, run_at: datetime = None):
+    # Посты дальше горизонта не попадают в планировщик — их подхватит refill_jobs.
+    # Задачи публикации ставит только лидер. run_at — запуск пропущенного поста
+    # позже «сейчас», чтобы догоняющие публикации не стартовали разом
+    if not coordinator.is_leader:
+        return
+    now = now or datetime.now()
+    when = post.when
+    if when > now + config.job_horizon:
+        return
     try:
-        with open(SCHEDULED_POSTS_FILE, "w", encoding="utf-8") as f:
-            json.dump(scheduled_posts, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logging.error(f"Ошибка сохранения scheduled_posts.json: {e}")
+        prepare_post(post)
+    except ValueError as e:
+        logging.error(f"Пост {post.job_id} не запланирован — не пройдёт проверку Telegram: {e}")
+        return
+    run_at = run_at or max(when, now)
+    if post.repeat:
+        # Серия — одна задача: первый запуск в time_iso (или сразу, если он
+        # пропущен), дальше следующие даты вычисляет триггер
+        trigger = make_trigger(post.repeat, when, scheduler.timezone)
+    else:
+        trigger = DateTrigger(run_date=run_at)
+    scheduler.add_job(
+        publish_post, trigger, next_run_time=run_at,
+        args=[post.job_id], id=post.job_id, replace_existing=True,
+    )
+
+
+def unschedule_post(job_id: str):
+    if scheduler.get_job(job_id):
+        scheduler.remove_job(job_id)
+
+
+async def refill_jobs():
+    # Корутина: планировщик выполняет её в цикле событий, а не в потоке —
+    # реестр и кэш шаблонов меняются только из цикла
+    if not coordinator.is_leader:
+        return
+    now = datetime.now()
+    for post in registry.due_before((now + config.job_horizon).isoformat()):
+        if not scheduler.get_job(post.job_id):
+            schedule_post(post, now)
+
+
+def restore_jobs() -> int:
+    # Один проход по индексу времени: в планировщик попадают только посты
+    # в пределах горизонта, поэтому время запуска не растёт вместе с очередью.
+    # Просроченные за время простоя посты идут первыми (индекс упорядочен по
+    # времени) и запускаются пачками по config.catchup_batch через config.catchup_step;
+    # публиковать их или нет, решает config.misfire_policy в publish_post.
+    legacy = [p.job_id for p in registry if p.text is None]
+    for job_id in legacy:
+        logging.warning(f"Пост {job_id} в старом формате без содержимого — удалён")
+        remove_post(job_id)
+
+    now = datetime.now()
+    due = registry.due_before((now + config.job_horizon).isoformat())
+    overdue = 0
+    for post in due:
+        if post.when < now:
+            schedule_post(post, now, run_at=now + config.catchup_step * (overdue // config.catchup_batch))
+            overdue += 1
+        else:
+            schedule_post(post, now)
+    if overdue:
+        logging.warning(f"Пропущено за время простоя: {overdue}, политика {config.misfire_policy}")
+    return len(due)
+
+
+async def become_leader():
+    global leader_since
+    leader_since = datetime.now()
+    await sync_from_store()
+    restored = restore_jobs()
+    logging.info(f"Постов в очереди: {len(registry)}, задач в планировщике: {restored}")
+
+
+async def step_down():
+    for job in scheduler.get_jobs():
+        if job.func is publish_post:
+            job.remove()
+    prepared.clear()
 
 
 class PostForm(StatesGroup):
     text = State()
     media = State()
     buttons = State()
+    targets = State()
     date = State()
     time = State()
+    repeat = State()
     confirm = State()
 
 
@@ -76,29 +569,40 @@ class EditForm(StatesGroup):
     edit_confirm = State()
 
 
+class ImportForm(StatesGroup):
+    file = State()
+
+
+class SearchForm(StatesGroup):
+    query = State()
+
+
 def get_main_menu():
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✨ Создать пост", callback_data="create_post")],
-        [InlineKeyboardButton(text="📅 Мои отложенные посты", callback_data="list_scheduled")],
+        [InlineKeyboardButton(text="✨ Создать пост", callback_data="new")],
+        [InlineKeyboardButton(text="📅 Мои отложенные посты", callback_data="ls")],
+        [InlineKeyboardButton(text="🔎 Поиск", callback_data="find")],
+        [InlineKeyboardButton(text="📥 Импорт из файла", callback_data="imp")],
+        [InlineKeyboardButton(text="📮 Неотправленные", callback_data="dlq")],
     ])
 
 
-@dp.message(Command(commands=['start']))
+@router.message(Command(commands=['start']))
 async def cmd_start(message: Message):
-    if message.from_user.id not in ADMIN_IDS:
+    if message.from_user.id not in config.admin_ids:
         await message.answer("Доступ запрещён.")
         return
     await message.answer("Привет! Выберите действие:", reply_markup=get_main_menu())
 
 
-@dp.callback_query(lambda c: c.data == "back_to_menu")
+@callbacks.action("menu")
 async def back_to_menu(callback: CallbackQuery):
     await callback.message.edit_text("Главное меню", reply_markup=get_main_menu())
     await callback.answer()
 
 
 # ─── Создание поста ───
-@dp.callback_query(lambda c: c.data == "create_post")
+@callbacks.action("new")
 async def start_create(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         "✍️ Напишите текст поста\n"
@@ -107,67 +611,138 @@ async def start_create(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PostForm.text)
 
 
-@dp.message(PostForm.text)
+@router.message(PostForm.text)
 async def process_text(message: Message, state: FSMContext):
     if not message.text.strip():
         await message.answer("Текст не может быть пустым.")
         return
+    try:
+        check_content(message.html_text.strip())
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}")
+        return
 
     await state.update_data(text=message.html_text.strip())
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📸 Добавить фото/видео", callback_data="add_media")],
-        [InlineKeyboardButton(text="➡️ Без медиа", callback_data="no_media")],
+        [InlineKeyboardButton(text="📸 Добавить фото, видео или файл", callback_data=pack("media", "add"))],
+        [InlineKeyboardButton(text="➡️ Без медиа", callback_data=pack("media", "none"))],
     ])
 
     await message.answer("Хотите прикрепить медиа?", reply_markup=kb)
     await state.set_state(PostForm.media)
 
 
-@dp.callback_query(PostForm.media, lambda c: c.data in ("add_media", "no_media"))
-async def process_media_choice(callback: CallbackQuery, state: FSMContext):
+@callbacks.action("media", state=PostForm.media)
+async def process_media_choice(callback: CallbackQuery, state: FSMContext, arg: str):
     await callback.message.delete_reply_markup()
 
-    if callback.data == "no_media":
-        await state.update_data(media_type=None, media_id=None)
+    if arg == "none":
+        await state.update_data(media_type=None, media_id=None, album=None)
         await ask_for_buttons(callback.message, state)
         return
 
-    await callback.message.answer("Пришлите фото или видео (одно).")
+    await callback.message.answer(
+        "Пришлите фото, видео или документ — или альбом (от 2 до 10 файлов одним сообщением)."
+    )
 
 
-@dp.message(PostForm.media, lambda m: m.photo or m.video)
-async def process_media(message: Message, state: FSMContext):
+def incoming_media(message: Message):
+    # (тип, file_id); один и тот же файл, присланный повторно, получает
+    # первый узнанный file_id — через кэш
     if message.photo:
-        media_id = message.photo[-1].file_id
-        media_type = 'photo'
+        media_type, media = "photo", message.photo[-1]
     elif message.video:
-        media_id = message.video.file_id
-        media_type = 'video'
+        media_type, media = "video", message.video
     else:
-        await message.answer("Пришлите фото или видео.")
+        media_type, media = "document", message.document
+    return media_type, file_cache.remember(media.file_id, media.file_id, media.file_unique_id)
+
+
+async def reject_media(message: Message, error: str):
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➡️ Без медиа", callback_data=pack("media", "none"))],
+    ])
+    await message.answer(error, reply_markup=kb)
+
+
+@router.message(PostForm.media, F.photo | F.video | F.document)
+async def process_media(message: Message, state: FSMContext):
+    media_type, media_id = incoming_media(message)
+    if message.media_group_id:
+        await collect_album(message, state, {"type": media_type, "id": media_id})
+        return
+
+    data = await state.get_data()
+    try:
+        check_content(data.get("text"), media_type)
+    except ValueError as e:
+        # Длинный текст годится для сообщения, но не для подписи
+        await reject_media(message, f"⚠️ {e}\nСократите текст или опубликуйте пост без медиа.")
         return
 
-    await state.update_data(media_type=media_type, media_id=media_id)
+    await state.update_data(media_type=media_type, media_id=media_id, album=None)
     await ask_for_buttons(message, state)
 
 
+# ─── Сбор альбома ───
+# Альбом приходит отдельными сообщениями с общим media_group_id, подряд и без
+# признака последнего. Очередь чата передаёт их обработчику по одному, и
+# элементы копятся в данных FSM; альбом считается собранным, когда новых
+# элементов нет config.album_wait секунд.
+album_waits = {}        # chat_id -> задача, завершающая сбор альбома
+
+
+async def collect_album(message: Message, state: FSMContext, item: dict):
+    data = await state.get_data()
+    group = message.media_group_id
+    items = data["album_items"] if data.get("album_group") == group else []
+    await state.update_data(album_group=group, album_items=items + [item])
+
+    waiting = album_waits.pop(message.chat.id, None)
+    if waiting:
+        waiting.cancel()
+    album_waits[message.chat.id] = asyncio.create_task(finish_album(message, state, group))
+
+
+async def finish_album(message: Message, state: FSMContext, group: str):
+    await asyncio.sleep(config.album_wait)
+    # Дальше задачу уже никто не отменит: следующий элемент начнёт новый сбор
+    album_waits.pop(message.chat.id, None)
+    data = await state.get_data()
+    if await state.get_state() != PostForm.media.state or data.get("album_group") != group:
+        return
+    items = data["album_items"]
+    await state.update_data(album_group=None, album_items=None)
+    try:
+        check_album(items)
+        check_content(data.get("text"), "album")
+    except ValueError as e:
+        await reject_media(message, f"⚠️ {e}\nПришлите медиа заново или опубликуйте пост без медиа.")
+        return
+
+    # Клавиатуру к альбому Telegram не прикрепляет — шаг с кнопками пропускается
+    await state.update_data(media_type="album", media_id=None, album=items, buttons=None)
+    await message.answer(f"Альбом собран, файлов: {len(items)}. Кнопки к альбому не добавляются.")
+    await ask_targets(message, state)
+
+
 async def ask_for_buttons(message: Message, state: FSMContext):
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Добавить кнопки", callback_data="add_buttons")],
-        [InlineKeyboardButton(text="Без кнопок", callback_data="no_buttons")],
+        [InlineKeyboardButton(text="Добавить кнопки", callback_data=pack("btns", "add"))],
+        [InlineKeyboardButton(text="Без кнопок", callback_data=pack("btns", "none"))],
     ])
     await message.answer("Добавить кнопки?", reply_markup=kb)
     await state.set_state(PostForm.buttons)
 
 
-@dp.callback_query(PostForm.buttons, lambda c: c.data in ("add_buttons", "no_buttons"))
-async def process_buttons_choice(callback: CallbackQuery, state: FSMContext):
+@callbacks.action("btns", state=PostForm.buttons)
+async def process_buttons_choice(callback: CallbackQuery, state: FSMContext, arg: str):
     await callback.message.delete_reply_markup()
 
-    if callback.data == "no_buttons":
+    if arg == "none":
         await state.update_data(buttons=None)
-        await ask_date(callback.message, state)
+        await ask_targets(callback.message, state)
         return
 
     await callback.message.answer(
@@ -178,34 +753,61 @@ async def process_buttons_choice(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@dp.message(PostForm.buttons)
+@router.message(PostForm.buttons)
 async def process_buttons(message: Message, state: FSMContext):
-    lines = [l.strip() for l in message.text.splitlines() if l.strip()]
-
-    if not lines:
-        await message.answer("Не распознано ни одной кнопки.")
+    try:
+        rows = parse_buttons(message.text)
+    except ValueError as e:
+        await message.answer(str(e))
         return
 
-    buttons_list = []
-    for line in lines:
-        if '|' not in line:
-            await message.answer(f"Неверный формат:\n{line}")
-            return
-        txt, url = [p.strip() for p in line.split('|', 1)]
-        if not txt or not url.startswith(('http://', 'https://')):
-            await message.answer(f"Ошибка в строке:\n{line}")
-            return
-        buttons_list.append(InlineKeyboardButton(text=txt, url=url))
+    await state.update_data(buttons=rows)
+    await ask_targets(message, state)
+
 
-    if len(buttons_list) > 8:
-        await message.answer("Максимум 8 кнопок.")
+# ─── Выбор каналов ───
+def targets_keyboard(selected):
+    rows = [
+        [InlineKeyboardButton(text=f"{'✅' if chat_id in selected else '▫️'} {name}", callback_data=pack("tg", chat_id))]
+        for chat_id, name in config.channels.items()
+    ]
+    rows.append([InlineKeyboardButton(text="Готово", callback_data=pack("tg", "done"))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def ask_targets(message: Message, state: FSMContext):
+    if len(config.channels) == 1:
+        await state.update_data(targets=list(config.channels))
+        await ask_date(message, state)
         return
 
-    rows = [buttons_list[i:i+2] for i in range(0, len(buttons_list), 2)]
-    markup = InlineKeyboardMarkup(inline_keyboard=rows)
+    await state.update_data(targets=list(config.channels))
+    await message.answer("В какие каналы публикуем?", reply_markup=targets_keyboard(config.channels))
+    await state.set_state(PostForm.targets)
 
-    await state.update_data(buttons=markup)
-    await ask_date(message, state)
+
+@callbacks.action("tg", state=PostForm.targets)
+async def process_targets(callback: CallbackQuery, state: FSMContext, arg: str):
+    data = await state.get_data()
+    selected = data.get("targets", [])
+
+    if arg == "done":
+        if not selected:
+            await callback.answer("Выберите хотя бы один канал", show_alert=True)
+            return
+        await callback.message.delete_reply_markup()
+        await callback.answer()
+        await ask_date(callback.message, state)
+        return
+
+    chat_id = int(arg)
+    if chat_id in selected:
+        selected = [c for c in selected if c != chat_id]
+    else:
+        selected = [c for c in config.channels if c in selected or c == chat_id]
+    await state.update_data(targets=selected)
+    await callback.message.edit_reply_markup(reply_markup=targets_keyboard(selected))
+    await callback.answer()
 
 
 async def ask_date(message: Message, state: FSMContext):
@@ -213,61 +815,159 @@ async def ask_date(message: Message, state: FSMContext):
     await state.set_state(PostForm.date)
 
 
-@dp.message(PostForm.date)
+@router.message(PostForm.date)
 async def process_date(message: Message, state: FSMContext):
     try:
-        dt = datetime.strptime(message.text.strip(), '%d.%m.%Y').date()
-        await state.update_data(pub_date=dt)
-    except ValueError:
-        await message.answer("Формат: ДД.ММ.ГГГГ")
+        await state.update_data(pub_date=parse_date(message.text))
+    except ValueError as e:
+        await message.answer(str(e))
         return
 
     await message.answer("⏰ Время: <code>ЧЧ:ММ</code>")
     await state.set_state(PostForm.time)
 
 
-@dp.message(PostForm.time)
+@router.message(PostForm.time)
 async def process_time(message: Message, state: FSMContext):
     data = await state.get_data()
     try:
-        tm = datetime.strptime(message.text.strip(), '%H:%M').time()
-        when = datetime.combine(data['pub_date'], tm)
-    except ValueError:
-        await message.answer("Формат: ЧЧ:ММ")
+        when = parse_time_on(data['pub_date'], message.text)
+        check_future(when)
+    except ValueError as e:
+        await message.answer(str(e))
         return
 
-    if when <= datetime.now():
-        await message.answer("Укажите будущее время.")
+    await load_done.wait()
+    slot = allocator.find_slot(when, data.get("targets"))
+    if slot != when:
+        await state.update_data(slot_datetime=slot)
+        await offer_slot(message, when, slot, allocator.conflicts(when, data.get("targets")), "slot")
         return
 
     await state.update_data(pub_datetime=when)
+    await ask_repeat(message, state)
 
+
+# ─── Занятое время ───
+def describe_conflicts(conflicts) -> str:
+    chat_id, _, when = conflicts[0]
+    text = f"в «{escape(config.channels.get(chat_id, str(chat_id)))}» на {when.strftime('%H:%M')} уже стоит пост"
+    others = len({job_id for _, job_id, _ in conflicts}) - 1
+    if others > 0:
+        text += f" (и ещё {others} рядом)"
+    return text
+
+
+async def offer_slot(message: Message, when: datetime, slot: datetime, conflicts, action: str):
+    # Между постами канала должно пройти не меньше config.post_spacing (config.channel_spacing):
+    # предлагаем ближайшее свободное время или ввести другое
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"✅ Сдвинуть на {slot.strftime('%d.%m %H:%M')}", callback_data=pack(action, "shift"))],
+        [InlineKeyboardButton(text="⏰ Другое время", callback_data=pack(action, "other"))],
+    ])
+    await message.answer(
+        f"⚠️ {when.strftime('%d.%m.%Y %H:%M')}: {describe_conflicts(conflicts) if conflicts else 'время занято'}.\n"
+        f"Ближайшее свободное время: <b>{slot.strftime('%d.%m.%Y %H:%M')}</b>",
+        reply_markup=kb,
+    )
+
+
+@callbacks.action("slot", state=PostForm.time)
+async def process_slot_choice(callback: CallbackQuery, state: FSMContext, arg: str):
+    await callback.message.delete_reply_markup()
+    await callback.answer()
+    if arg != "shift":
+        await callback.message.answer("⏰ Время: <code>ЧЧ:ММ</code>")
+        return
+
+    data = await state.get_data()
+    slot = data["slot_datetime"]
+    # Пока админ думал, слот мог занять кто-то ещё
+    fresh = allocator.find_slot(slot, data.get("targets"))
+    if fresh != slot:
+        await state.update_data(slot_datetime=fresh)
+        await offer_slot(callback.message, slot, fresh, allocator.conflicts(slot, data.get("targets")), "slot")
+        return
+    await state.update_data(pub_datetime=slot)
+    await ask_repeat(callback.message, state)
+
+
+async def ask_repeat(message: Message, state: FSMContext):
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Один раз", callback_data=pack("rep", "once"))],
+        [InlineKeyboardButton(text="Каждый день", callback_data=pack("rep", "daily")),
+         InlineKeyboardButton(text="Каждую неделю", callback_data=pack("rep", "weekly"))],
+        [InlineKeyboardButton(text="Свой интервал", callback_data=pack("rep", "custom"))],
+    ])
+    await message.answer("🔁 Повторять пост?", reply_markup=kb)
+    await state.set_state(PostForm.repeat)
+
+
+@callbacks.action("rep", state=PostForm.repeat)
+async def process_repeat_choice(callback: CallbackQuery, state: FSMContext, arg: str):
+    await callback.message.delete_reply_markup()
+    await callback.answer()
+
+    if arg == "custom":
+        await callback.message.answer(
+            "Пришлите интервал или расписание crontab:\n\n"
+            "<code>каждые 6 ч</code>, <code>90 мин</code>, <code>2 д</code>\n"
+            "<code>30 9 * * mon-fri</code> — минута, час, день, месяц, день недели"
+        )
+        return
+
+    data = await state.get_data()
+    repeat = None if arg == "once" else preset(arg, data['pub_datetime'])
+    await state.update_data(repeat=repeat)
+    await ask_confirm(callback.message, state)
+
+
+@router.message(PostForm.repeat)
+async def process_repeat(message: Message, state: FSMContext):
+    data = await state.get_data()
+    try:
+        repeat = parse_repeat(message.text, data['pub_datetime'])
+    except ValueError as e:
+        await message.answer(str(e))
+        return
+
+    await state.update_data(repeat=repeat)
+    await ask_confirm(message, state)
+
+
+async def ask_confirm(message: Message, state: FSMContext):
+    data = await state.get_data()
     text = data.get('text', '')
     media_type = data.get('media_type')
     buttons = data.get('buttons')
-    dt_str = when.strftime("%d.%m.%Y в %H:%M")
+    repeat = data.get('repeat')
+    dt_str = data['pub_datetime'].strftime("%d.%m.%Y в %H:%M")
 
     preview = f"<b>Текст:</b>\n{text or '—'}\n\n"
     if media_type:
-        preview += f"<b>Медиа:</b> {media_type}\n"
+        preview += f"<b>Медиа:</b> {describe_media(media_type, data.get('album'))}\n"
     if buttons:
         preview += "<b>Кнопки:</b> да\n"
+    if len(config.channels) > 1:
+        preview += f"<b>Каналы:</b> {', '.join(escape(config.channels.get(c, str(c))) for c in data.get('targets', []))}\n"
     preview += f"<b>Время:</b> {dt_str}"
+    if repeat:
+        preview += f"\n<b>Повтор:</b> {describe(repeat)}"
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Запланировать", callback_data="confirm_publish")],
-        [InlineKeyboardButton(text="✖ Отменить", callback_data="cancel_publish")],
+        [InlineKeyboardButton(text="✅ Запланировать", callback_data=pack("pub", "ok"))],
+        [InlineKeyboardButton(text="✖ Отменить", callback_data=pack("pub", "cancel"))],
     ])
 
     await message.answer(f"Проверьте пост:\n\n{preview}", reply_markup=kb)
     await state.set_state(PostForm.confirm)
 
 
-@dp.callback_query(lambda c: c.data in ("confirm_publish", "cancel_publish"))
-async def process_confirm(callback: CallbackQuery, state: FSMContext):
+@callbacks.action("pub", state=PostForm.confirm)
+async def process_confirm(callback: CallbackQuery, state: FSMContext, arg: str):
     await callback.message.delete()
 
-    if callback.data == "cancel_publish":
+    if arg == "cancel":
         await callback.message.answer("Создание отменено.", reply_markup=get_main_menu())
         await state.clear()
         return
@@ -279,106 +979,237 @@ async def process_confirm(callback: CallbackQuery, state: FSMContext):
     buttons = data.get('buttons')
     when = data['pub_datetime']
 
-    job_id = f"post_{callback.from_user.id}_{int(when.timestamp())}"
-
-    async def send_post():
-        try:
-            if media_type == 'photo':
-                await bot.send_photo(CHANNEL_ID, photo=media_id, caption=text, reply_markup=buttons)
-            elif media_type == 'video':
-                await bot.send_video(CHANNEL_ID, video=media_id, caption=text, reply_markup=buttons)
-            else:
-                await bot.send_message(CHANNEL_ID, text=text, reply_markup=buttons)
-
-            global scheduled_posts
-            scheduled_posts = [p for p in scheduled_posts if p["job_id"] != job_id]
-            save_scheduled_posts()
-
-        except Exception as e:
-            logging.error(f"Ошибка публикации: {e}")
+    # Слот проверялся при вводе времени, но за это время его мог занять другой админ
+    slot = allocator.find_slot(when, data.get('targets'))
+    if slot != when:
+        await state.update_data(slot_datetime=slot)
+        await state.set_state(PostForm.time)
+        await offer_slot(callback.message, when, slot, allocator.conflicts(when, data.get('targets')), "slot")
+        return
 
-    scheduler.add_job(send_post, DateTrigger(run_date=when), id=job_id)
+    job_id = allocator.job_id(callback.from_user.id, when)
 
-    post_info = {
-        "job_id": job_id,
-        "user_id": callback.from_user.id,
-        "time_iso": when.isoformat(),
-        "time_str": when.strftime("%d.%m.%Y в %H:%M"),
-        "text_preview": escape(text[:80] + ("..." if len(text or "") > 80 else text or "[без текста]")),
-        "has_media": bool(media_type),
-        "media_type": media_type,
-        "has_buttons": bool(buttons)
-    }
+    post = Post(
+        job_id, callback.from_user.id, when, text,
+        media_type=media_type, media_id=media_id, album=data.get('album'), buttons=buttons,
+        targets=data.get('targets'), repeat=data.get('repeat'),
+    )
+    try:
+        check_content(post.text, post.media_type, post.buttons)
+        if post.album:
+            check_album(post.album)
+    except ValueError as e:
+        await callback.message.answer(f"⚠️ Пост не сохранён: {e}", reply_markup=get_main_menu())
+        await state.clear()
+        return
 
-    scheduled_posts.append(post_info)
-    save_scheduled_posts()
+    add_post(post)
+    schedule_post(post)
 
+    repeat_str = f", {describe(post.repeat)}" if post.repeat else ""
     await callback.message.answer(
-        f"✅ Запланировано на <b>{post_info['time_str']}</b>",
+        f"✅ Запланировано на <b>{post.time_str}</b>{repeat_str}",
         reply_markup=get_main_menu()
     )
     await state.clear()
 
 
 # ─── Список отложенных постов ───
-@dp.callback_query(lambda c: c.data == "list_scheduled")
-async def show_scheduled(callback: CallbackQuery):
-    if not scheduled_posts:
+def post_line(i: int, post: Post) -> str:
+    line = f"{i}. {post.time_str} — {post.text_preview}"
+    if post.has_media:
+        line += f" + {describe_media(post.media_type, post.album)}"
+    if post.has_buttons:
+        line += " + кнопки"
+    if post.repeat:
+        line += f" 🔁 {describe(post.repeat)}"
+    return line
+
+
+def post_actions(i: int, post: Post) -> list:
+    return [
+        InlineKeyboardButton(text=f"👁 №{i}", callback_data=pack("pv", post.job_id)),
+        InlineKeyboardButton(text=f"✏ №{i}", callback_data=pack("ed", post.job_id)),
+        InlineKeyboardButton(text=f"❌ №{i}", callback_data=pack("del", post.job_id)),
+    ]
+
+
+def render_page(page: int):
+    # Кэшируются только строки постов и их кнопки; заголовок и навигация
+    # зависят от общего числа постов и собираются заново
+    cached = page_cache.get(page)
+    if not cached:
+        first = page * PAGE_SIZE
+        body = ""
+        item_rows = []
+        for i, post in enumerate(registry.slice(first, first + PAGE_SIZE), first + 1):
+            body += post_line(i, post) + "\n\n"
+            item_rows.append(post_actions(i, post))
+        cached = page_cache[page] = (body, item_rows)
+
+    body, item_rows = cached
+    total = len(registry)
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    text = f"📅 <b>Отложенные посты</b> ({total}), стр. {page + 1}/{pages}\n\n" + body
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀", callback_data=pack("ls", encode_cursor(page - 1))))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=pack("ls", encode_cursor(page + 1))))
+
+    kb_rows = item_rows + ([nav] if nav else [])
+    kb_rows.append([InlineKeyboardButton(text="← Назад", callback_data="menu")])
+    return text, InlineKeyboardMarkup(inline_keyboard=kb_rows)
+
+
+@callbacks.action("ls")
+async def show_scheduled(callback: CallbackQuery, arg: str = "", page: int = None):
+    await load_done.wait()
+    if not registry:
         await callback.message.edit_text(
             "Нет отложенных постов.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="← Назад", callback_data="back_to_menu")]
+                [InlineKeyboardButton(text="← Назад", callback_data="menu")]
             ])
         )
         await callback.answer()
         return
 
-    text = "📅 <b>Отложенные посты</b>\n\n"
-    kb_rows = []
+    if page is None:
+        page = decode_cursor(arg) if arg else 0
+    last_page = (len(registry) - 1) // PAGE_SIZE
+    text, markup = render_page(min(max(page, 0), last_page))
+
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
+# ─── Поиск по постам ───
+# Запрос хранится в данных FSM: callback_data слишком короткая для текста
+# запроса, а листание страниц должно работать и после перезапуска.
+FIND_HELP = (
+    "🔎 Пришлите слова из текста поста или подписей кнопок.\n\n"
+    "Период: <code>с ДД.ММ.ГГГГ по ДД.ММ.ГГГГ</code> (можно только одну границу), "
+    "один день — просто дата.\n"
+    "Например: <code>распродажа с 01.11.2026</code>"
+)
 
-    for i, post in enumerate(scheduled_posts, 1):
-        safe_preview = escape(post['text_preview'])
-        line = f"{i}. {post['time_str']} — {safe_preview}"
-        if post.get("has_media"):
-            line += f" + {post.get('media_type', '')}"
-        if post.get("has_buttons"):
-            line += " + кнопки"
-        text += line + "\n\n"
 
-        kb_rows.append([
-            InlineKeyboardButton(text=f"👁 Посмотреть №{i}", callback_data=f"preview_{post['job_id']}"),
-            InlineKeyboardButton(text=f"✏ Редактировать №{i}", callback_data=f"edit_{post['job_id']}"),
-            InlineKeyboardButton(text=f"❌ Удалить №{i}", callback_data=f"delete_{post['job_id']}"),
+def render_results(query: str, page: int):
+    terms, start, end = parse_query(query)
+    found = search_index.search(terms, start, end)
+    back = [InlineKeyboardButton(text="← Назад", callback_data="menu")]
+    if not found:
+        return "Ничего не найдено.", InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔎 Искать ещё", callback_data="find")], back,
         ])
 
-    kb_rows.append([InlineKeyboardButton(text="← Назад", callback_data="back_to_menu")])
+    pages = (len(found) + PAGE_SIZE - 1) // PAGE_SIZE
+    page = min(max(page, 0), pages - 1)
+    first = page * PAGE_SIZE
+    text = f"🔎 <b>{escape(query)}</b> — найдено {len(found)}, стр. {page + 1}/{pages}\n\n"
+    rows = []
+    for i, job_id in enumerate(found[first:first + PAGE_SIZE], first + 1):
+        post = registry.get(job_id)
+        text += post_line(i, post) + "\n\n"
+        rows.append(post_actions(i, post))
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀", callback_data=pack("fd", page - 1)))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=pack("fd", page + 1)))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🔎 Искать ещё", callback_data="find")])
+    rows.append(back)
+    return text, InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def answer_search(message: Message, state: FSMContext, query: str):
+    await load_done.wait()
+    try:
+        text, markup = render_results(query, 0)
+    except ValueError as e:
+        await message.answer(str(e))
+        return
+    await state.set_state(None)
+    await state.update_data(find_query=query)
+    await message.answer(text, reply_markup=markup)
 
-    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows))
+
+@router.message(Command(commands=['find']))
+async def cmd_find(message: Message, state: FSMContext, command: CommandObject):
+    if message.from_user.id not in config.admin_ids:
+        await message.answer("Доступ запрещён.")
+        return
+    if command.args:
+        await answer_search(message, state, command.args)
+        return
+    await state.set_state(SearchForm.query)
+    await message.answer(FIND_HELP)
+
+
+@callbacks.action("find")
+async def start_find(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(SearchForm.query)
+    await callback.message.edit_text(FIND_HELP, reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="← Назад", callback_data="menu")]
+    ]))
+    await callback.answer()
+
+
+@router.message(SearchForm.query)
+async def process_find(message: Message, state: FSMContext):
+    await answer_search(message, state, message.text or "")
+
+
+@callbacks.action("fd")
+async def show_results(callback: CallbackQuery, state: FSMContext, arg: str = ""):
+    query = (await state.get_data()).get("find_query")
+    await load_done.wait()
+    if not query:
+        await callback.answer("Поиск устарел, начните заново.", show_alert=True)
+        return
+    try:
+        text, markup = render_results(query, int(arg) if arg.isdigit() else 0)
+    except ValueError as e:
+        await callback.answer(str(e), show_alert=True)
+        return
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
 # ─── Предпросмотр ───
-@dp.callback_query(lambda c: c.data.startswith("preview_"))
-async def preview_post(callback: CallbackQuery):
-    job_id = callback.data.split("_", 1)[1]
-    post = next((p for p in scheduled_posts if p["job_id"] == job_id), None)
+@callbacks.action("pv")
+async def preview_post(callback: CallbackQuery, arg: str):
+    job_id = arg
+    post = registry.get(job_id)
 
     if not post:
         await callback.answer("Пост не найден", show_alert=True)
         return
 
     preview = f"<b>Предпросмотр поста</b>\n\n"
-    preview += f"<b>Время:</b> {post['time_str']}\n\n"
-    preview += f"<b>Текст:</b>\n{escape(post.get('text_preview', '[без текста]'))}\n\n"
+    preview += f"<b>Время:</b> {post.time_str}\n\n"
+    preview += f"<b>Текст:</b>\n{post.text_preview}\n\n"
 
-    if post.get("has_media"):
-        preview += f"<b>Медиа:</b> {post.get('media_type', '—')}\n"
-    if post.get("has_buttons"):
+    if post.has_media:
+        preview += f"<b>Медиа:</b> {describe_media(post.media_type, post.album)}\n"
+    if post.has_buttons:
         preview += "<b>Кнопки:</b> есть\n"
+    if len(config.channels) > 1:
+        preview += f"<b>Каналы:</b> {len(post.targets or config.channels)}\n"
+    if post.repeat:
+        # Следующие даты считаются на лету из правила, в хранилище их нет
+        dates = [post.when] + upcoming(post.repeat, post.when, post.when, PREVIEW_OCCURRENCES - 1, scheduler.timezone)
+        preview += f"<b>Повтор:</b> {describe(post.repeat)}\n"
+        preview += "<b>Ближайшие:</b> " + ", ".join(d.strftime("%d.%m %H:%M") for d in dates) + "\n"
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="← К списку", callback_data="list_scheduled")],
-        [InlineKeyboardButton(text="← Главное меню", callback_data="back_to_menu")]
+        [InlineKeyboardButton(text="← К списку", callback_data=pack("ls", encode_cursor(page_of(job_id))))],
+        [InlineKeyboardButton(text="← Главное меню", callback_data="menu")]
     ])
 
     await callback.message.edit_text(preview, reply_markup=kb)
@@ -386,37 +1217,32 @@ async def preview_post(callback: CallbackQuery):
 
 
 # ─── Удаление поста ───
-@dp.callback_query(lambda c: c.data.startswith("delete_"))
-async def delete_post(callback: CallbackQuery):
-    job_id = callback.data.split("_", 1)[1]
+@callbacks.action("del")
+async def delete_post(callback: CallbackQuery, arg: str):
+    job_id = arg
 
-    post_index = next((i for i, p in enumerate(scheduled_posts) if p["job_id"] == job_id), -1)
+    post = registry.get(job_id)
 
-    if post_index == -1:
+    if not post:
         await callback.answer("Пост уже удалён", show_alert=True)
         return
 
-    post = scheduled_posts[post_index]
-
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
-
-    del scheduled_posts[post_index]
-    save_scheduled_posts()
+    page = page_of(job_id)
+    unschedule_post(job_id)
+    remove_post(job_id)
 
-    await callback.answer(f"Пост удалён: {post['time_str']}", show_alert=True)
-    await show_scheduled(callback)
+    await callback.answer(f"Пост удалён: {post.time_str}", show_alert=True)
+    await show_scheduled(callback, page=page)
 
 
 # ─── Редактирование поста ───
-@dp.callback_query(lambda c: c.data.startswith("edit_"))
-async def start_edit(callback: CallbackQuery, state: FSMContext):
-    job_id = callback.data.split("_", 1)[1]
+@callbacks.action("ed")
+async def start_edit(callback: CallbackQuery, state: FSMContext, arg: str):
+    job_id = arg
 
     logging.info(f"Попытка редактирования job_id: {job_id}")
-    logging.info(f"Доступные job_id: {[p['job_id'] for p in scheduled_posts]}")
 
-    post = next((p for p in scheduled_posts if p["job_id"] == job_id), None)
+    post = registry.get(job_id)
 
     if not post:
         await callback.answer("Пост не найден — возможно, он уже опубликован или удалён.", show_alert=True)
@@ -425,36 +1251,35 @@ async def start_edit(callback: CallbackQuery, state: FSMContext):
 
     await state.update_data(
         editing_job_id=job_id,
-        old_text=post.get("text_preview", ""),
-        old_time_iso=post["time_iso"],
-        old_has_buttons=post.get("has_buttons", False)
+        old_text=post.text or "",
+        old_time_iso=post.time_iso,
+        old_has_buttons=post.has_buttons,
     )
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Изменить текст",   callback_data=f"edit_text__{job_id}")],
-        [InlineKeyboardButton(text="Изменить время",   callback_data=f"edit_time__{job_id}")],
-        [InlineKeyboardButton(text="Изменить кнопки",  callback_data=f"edit_buttons__{job_id}")],
-        [InlineKeyboardButton(text="← Отмена",         callback_data="cancel_edit")],
+        [InlineKeyboardButton(text="Изменить текст",   callback_data=pack("ed_text", job_id))],
+        [InlineKeyboardButton(text="Изменить время",   callback_data=pack("ed_time", job_id))],
+        [InlineKeyboardButton(text="Изменить кнопки",  callback_data=pack("ed_btns", job_id))],
+        [InlineKeyboardButton(text="← Отмена",         callback_data="ed_cancel")],
     ])
 
     await callback.message.edit_text(
-        f"Редактирование поста от {post['time_str']}\n\nЧто меняем?",
+        f"Редактирование поста от {post.time_str}\n\nЧто меняем?",
         reply_markup=kb
     )
     await callback.answer()
 
 
-@dp.callback_query(lambda c: c.data == "cancel_edit")
+@callbacks.action("ed_cancel")
 async def cancel_edit(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
     await state.clear()
-    await show_scheduled(callback)
+    await show_scheduled(callback, page=page_of(data.get("editing_job_id", "")))
 
 
 # ─── Редактирование текста ───
-@dp.callback_query(lambda c: c.data.startswith("edit_text__"))
+@callbacks.action("ed_text")
 async def edit_text_start(callback: CallbackQuery, state: FSMContext):
-    job_id = callback.data.split("__", 1)[1]
-
     data = await state.get_data()
     await callback.message.edit_text(
         f"Текущий текст:\n{escape(data.get('old_text', '[без текста]'))}\n\n"
@@ -463,21 +1288,28 @@ async def edit_text_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditForm.edit_text)
 
 
-@dp.message(EditForm.edit_text)
+@router.message(EditForm.edit_text)
 async def process_edit_text(message: Message, state: FSMContext):
     if not message.text.strip():
         await message.answer("Текст не может быть пустым.")
         return
 
+    data = await state.get_data()
+    old_post = registry.get(data["editing_job_id"])
+    try:
+        check_content(message.html_text.strip(), old_post and old_post.media_type,
+                      data.get("new_buttons", old_post and old_post.buttons))
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}")
+        return
+
     await state.update_data(new_text=message.html_text.strip())
     await ask_edit_confirm(message, state)
 
 
 # ─── Редактирование времени ───
-@dp.callback_query(lambda c: c.data.startswith("edit_time__"))
+@callbacks.action("ed_time")
 async def edit_time_start(callback: CallbackQuery, state: FSMContext):
-    job_id = callback.data.split("__", 1)[1]
-
     await callback.message.edit_text(
         "Введите новую дату и время:\n"
         "<code>ДД.ММ.ГГГГ ЧЧ:ММ</code>\nПример: 15.03.2026 14:30"
@@ -485,30 +1317,45 @@ async def edit_time_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditForm.edit_time)
 
 
-@dp.message(EditForm.edit_time)
+@router.message(EditForm.edit_time)
 async def process_edit_time(message: Message, state: FSMContext):
     try:
-        dt_str, tm_str = message.text.strip().split()
-        dt = datetime.strptime(dt_str, '%d.%m.%Y').date()
-        tm = datetime.strptime(tm_str, '%H:%M').time()
-        new_when = datetime.combine(dt, tm)
-    except:
-        await message.answer("Формат: ДД.ММ.ГГГГ ЧЧ:ММ")
+        new_when = parse_datetime(message.text)
+        check_future(new_when)
+    except ValueError as e:
+        await message.answer(str(e))
         return
 
-    if new_when <= datetime.now():
-        await message.answer("Время должно быть в будущем.")
+    await load_done.wait()
+    data = await state.get_data()
+    job_id = data["editing_job_id"]
+    targets = registry.get(job_id).targets if job_id in registry else None
+    slot = allocator.find_slot(new_when, targets, exclude=job_id)
+    if slot != new_when:
+        await state.update_data(slot_datetime=slot)
+        await offer_slot(message, new_when, slot, allocator.conflicts(new_when, targets, exclude=job_id), "ed_slot")
         return
 
     await state.update_data(new_datetime=new_when)
     await ask_edit_confirm(message, state)
 
 
+@callbacks.action("ed_slot", state=EditForm.edit_time)
+async def process_edit_slot_choice(callback: CallbackQuery, state: FSMContext, arg: str):
+    await callback.message.delete_reply_markup()
+    await callback.answer()
+    if arg != "shift":
+        await callback.message.answer("Введите дату и время: <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>")
+        return
+
+    data = await state.get_data()
+    await state.update_data(new_datetime=data["slot_datetime"])
+    await ask_edit_confirm(callback.message, state)
+
+
 # ─── Редактирование кнопок ───
-@dp.callback_query(lambda c: c.data.startswith("edit_buttons__"))
+@callbacks.action("ed_btns")
 async def edit_buttons_start(callback: CallbackQuery, state: FSMContext):
-    job_id = callback.data.split("__", 1)[1]
-
     await callback.message.edit_text(
         "Пришлите новые кнопки (или «без кнопок»):\n\n"
         "Текст | https://ссылка\nпо одной на строку"
@@ -516,26 +1363,18 @@ async def edit_buttons_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EditForm.edit_buttons)
 
 
-@dp.message(EditForm.edit_buttons)
+@router.message(EditForm.edit_buttons)
 async def process_edit_buttons(message: Message, state: FSMContext):
-    text = message.text.strip().lower()
-    if text in ("без кнопок", "убрать", "нет", "без"):
+    text = message.text or ""
+    if text.strip().lower() in ("без кнопок", "убрать", "нет", "без"):
         await state.update_data(new_buttons=None)
     else:
-        lines = [l.strip() for l in message.text.splitlines() if l.strip()]
-        buttons_list = []
-        for line in lines:
-            if '|' not in line: continue
-            txt, url = [p.strip() for p in line.split('|', 1)]
-            if url.startswith(('http://', 'https://')):
-                buttons_list.append(InlineKeyboardButton(text=txt, url=url))
-
-        if buttons_list:
-            rows = [buttons_list[i:i+2] for i in range(0, len(buttons_list), 2)]
-            markup = InlineKeyboardMarkup(inline_keyboard=rows)
-            await state.update_data(new_buttons=markup)
-        else:
-            await state.update_data(new_buttons=None)
+        try:
+            rows = parse_buttons(text)
+        except ValueError as e:
+            await message.answer(str(e))
+            return
+        await state.update_data(new_buttons=rows)
 
     await ask_edit_confirm(message, state)
 
@@ -552,85 +1391,437 @@ async def ask_edit_confirm(message: Message, state: FSMContext):
         preview += f"<b>Кнопки:</b> {'да' if data['new_buttons'] else 'убраны'}\n"
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Сохранить", callback_data="save_edit")],
-        [InlineKeyboardButton(text="✖ Отменить", callback_data="cancel_edit")]
+        [InlineKeyboardButton(text="✅ Сохранить", callback_data="ed_save")],
+        [InlineKeyboardButton(text="✖ Отменить", callback_data="ed_cancel")]
     ])
 
     await message.answer(preview or "Ничего не изменено.", reply_markup=kb)
     await state.set_state(EditForm.edit_confirm)
 
 
-@dp.callback_query(EditForm.edit_confirm, lambda c: c.data == "save_edit")
+@callbacks.action("ed_save", state=EditForm.edit_confirm)
 async def save_edit(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     old_job_id = data["editing_job_id"]
 
-    if scheduler.get_job(old_job_id):
-        scheduler.remove_job(old_job_id)
-
-    global scheduled_posts
-    scheduled_posts = [p for p in scheduled_posts if p["job_id"] != old_job_id]
+    old_post = registry.get(old_job_id)
+    if not old_post:
+        await callback.answer("Пост не найден — возможно, он уже опубликован.", show_alert=True)
+        await state.clear()
+        return
 
     new_text = data.get("new_text")
     new_when = data.get("new_datetime")
-    new_buttons = data.get("new_buttons")
 
-    old_post = next((p for p in scheduled_posts if p["job_id"] == old_job_id), {})
-    final_text = new_text or old_post.get("text_preview", "")
-    final_when = new_when or datetime.fromisoformat(old_post["time_iso"])
-    final_buttons = new_buttons if "new_buttons" in data else None
+    changes = {"user_id": callback.from_user.id}
+    if new_text:
+        changes["text"] = new_text
+    if new_when:
+        changes["when"] = new_when
+        if old_post.repeat:
+            changes["repeat"] = reanchor(old_post.repeat, old_post.when, new_when)
+    if "new_buttons" in data:
+        changes["buttons"] = data["new_buttons"]
+    post = replace(old_post, **changes)
+    try:
+        check_content(post.text, post.media_type, post.buttons)
+    except ValueError as e:
+        await callback.answer(f"⚠️ {e}", show_alert=True)
+        return
+    if new_when and allocator.find_slot(new_when, post.targets, exclude=old_job_id) != new_when:
+        await callback.answer("Это время уже заняли — выберите другое.", show_alert=True)
+        await state.set_state(EditForm.edit_time)
+        await callback.message.answer("Введите дату и время: <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>")
+        return
 
-    new_job_id = f"post_{callback.from_user.id}_{int(final_when.timestamp())}"
+    unschedule_post(old_job_id)
+    remove_post(old_job_id)
+    post = replace(post, job_id=allocator.job_id(callback.from_user.id, post.when))
+    add_post(post)
+    schedule_post(post)
 
-    async def send_post():
-        try:
-            await bot.send_message(
-                chat_id=CHANNEL_ID,
-                text=final_text,
-                reply_markup=final_buttons
-            )
-            scheduled_posts = [p for p in scheduled_posts if p["job_id"] != new_job_id]
-            save_scheduled_posts()
-        except Exception as e:
-            logging.error(f"Ошибка: {e}")
+    await callback.message.edit_text(
+        f"✅ Пост обновлён на <b>{post.time_str}</b>",
+        reply_markup=get_main_menu()
+    )
+    await state.clear()
 
-    scheduler.add_job(send_post, DateTrigger(run_date=final_when), id=new_job_id)
 
-    post_info = {
-        "job_id": new_job_id,
-        "user_id": callback.from_user.id,
-        "time_iso": final_when.isoformat(),
-        "time_str": final_when.strftime("%d.%m.%Y в %H:%M"),
-        "text_preview": escape(final_text[:80] + ("..." if len(final_text) > 80 else "")),
-        "has_media": False,
-        "media_type": None,
-        "has_buttons": bool(final_buttons)
-    }
+# ─── Отчёт об опоздавших публикациях ───
+@router.message(Command(commands=['late']))
+async def cmd_late(message: Message):
+    if message.from_user.id not in config.admin_ids:
+        await message.answer("Доступ запрещён.")
+        return
+    if not misfires:
+        await message.answer("Опоздавших публикаций не было.")
+        return
 
-    scheduled_posts.append(post_info)
-    save_scheduled_posts()
+    lines = [f"⏰ <b>Опоздавшие публикации</b> (политика: {config.misfire_policy}, последние {len(misfires)})\n"]
+    for job_id, time_str, lateness, outcome in reversed(misfires):
+        lines.append(f"{time_str} — {format_lateness(lateness)} — {outcome} — <code>{escape(job_id)}</code>")
+    text = "\n".join(lines)
+    if len(text) > 4000:
+        text = text[:text.rfind("\n", 0, 4000)]
+    await message.answer(text)
+
+
+# ─── Неотправленные публикации ───
+@callbacks.action("dlq")
+async def show_dead_letters(callback: CallbackQuery, arg: str = ""):
+    total = (await asyncio.to_thread(outbox.counts)).get("dead", 0)
+    back = [InlineKeyboardButton(text="← Назад", callback_data="menu")]
+    if not total:
+        await callback.message.edit_text(
+            "Неотправленных публикаций нет.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[back]),
+        )
+        await callback.answer()
+        return
+
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = min(int(arg) if arg.isdigit() else 0, pages - 1)
+    items = await asyncio.to_thread(outbox.dead, page * PAGE_SIZE, PAGE_SIZE)
+
+    text = f"📮 <b>Неотправленные</b> ({total}), стр. {page + 1}/{pages}\n\n"
+    rows = []
+    for i, delivery in enumerate(items, page * PAGE_SIZE + 1):
+        channel = escape(config.channels.get(delivery.chat_id, str(delivery.chat_id)))
+        text += (
+            f"{i}. {delivery.post.time_str} → {channel} — {delivery.post.text_preview}\n"
+            f"⚠️ {escape(delivery.error or '')} (попыток: {delivery.attempts})\n\n"
+        )
+        rows.append([
+            InlineKeyboardButton(text=f"🔁 №{i}", callback_data=pack("dlq_retry", delivery.id)),
+            InlineKeyboardButton(text=f"🗑 №{i}", callback_data=pack("dlq_drop", delivery.id)),
+        ])
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀", callback_data=pack("dlq", page - 1)))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=pack("dlq", page + 1)))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🔁 Повторить все", callback_data=pack("dlq_retry", "all"))])
+    rows.append(back)
+    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    await callback.answer()
+
+
+@callbacks.action("dlq_retry")
+async def requeue_dead_letter(callback: CallbackQuery, arg: str):
+    delivery_id = None if arg == "all" else int(arg)
+    count = await asyncio.to_thread(outbox.requeue, delivery_id)
+    if count:
+        kick_retries()
+    await callback.answer(f"Поставлено на повтор: {count}" if count else "Уже не в списке", show_alert=True)
+    await show_dead_letters(callback)
+
+
+@callbacks.action("dlq_drop")
+async def drop_dead_letter(callback: CallbackQuery, arg: str):
+    dropped = await asyncio.to_thread(outbox.drop, int(arg))
+    await callback.answer("Удалено из списка" if dropped else "Уже не в списке")
+    await show_dead_letters(callback)
+
+
+# ─── Массовый импорт из файла ───
+IMPORT_HELP = (
+    "📥 Пришлите файл <b>.csv</b>, <b>.json</b> или <b>.jsonl</b> с постами.\n\n"
+    "Поля: <code>text</code>, <code>datetime</code> (ДД.ММ.ГГГГ ЧЧ:ММ), "
+    "<code>media_type</code> (photo/video/document/album), <code>media_id</code> (file_id или ссылка), "
+    "<code>album</code> (строки «photo ссылка», от 2 до 10), "
+    "<code>buttons</code> (строки «Текст | https://ссылка»), <code>targets</code> (ID каналов через запятую), "
+    "<code>repeat</code> (ежедневно, еженедельно, «каждые 6 ч» или crontab).\n"
+    "Строки с ошибками пропускаются, остальные будут запланированы."
+)
+IMPORT_REPORT_LIMIT = 30
+
+
+@router.message(Command(commands=['import']))
+async def cmd_import(message: Message, state: FSMContext):
+    if message.from_user.id not in config.admin_ids:
+        await message.answer("Доступ запрещён.")
+        return
+    await state.set_state(ImportForm.file)
+    await message.answer(IMPORT_HELP)
+
+
+@callbacks.action("imp")
+async def start_import(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(ImportForm.file)
+    await callback.message.edit_text(IMPORT_HELP)
+    await callback.answer()
+
+
+@router.message(ImportForm.file, F.document)
+async def process_import(message: Message, state: FSMContext):
+    document = message.document
+    raw = (await bot.download(document)).getvalue()
+    try:
+        report = await asyncio.to_thread(parse_import, raw, document.file_name, config.channels)
+    except ValueError as e:
+        await message.answer(f"Не удалось прочитать файл: {escape(str(e))}")
+        return
+
+    await load_done.wait()
+    user_id = message.from_user.id
+    batch = int(time.time())
+    # Строки на занятое время сдвигаются на ближайший свободный слот; слот
+    # резервируется сразу, чтобы следующие строки файла его видели
+    posts, shifted = [], 0
+    for row, f in report.rows:
+        when = allocator.find_slot(f["when"], f["targets"])
+        repeat = f["repeat"]
+        if when != f["when"]:
+            shifted += 1
+            repeat = repeat and reanchor(repeat, f["when"], when)
+        post = Post(
+            allocator.job_id(user_id, when), user_id, when, f["text"],
+            media_type=f["media_type"], media_id=f["media_id"], album=f["album"], buttons=f["buttons"],
+            targets=f["targets"], repeat=repeat,
+        )
+        allocator.add(post)
+        posts.append(post)
+    if posts:
+        try:
+            await add_posts(posts)
+        except Exception as e:
+            for post in posts:
+                allocator.remove(post.job_id)
+            logging.error(f"Ошибка импорта {len(posts)} постов: {e}")
+            await message.answer("Ошибка сохранения, ничего не импортировано.")
+            return
+        now = datetime.now()
+        for post in posts:
+            schedule_post(post, now)
 
-    await callback.message.edit_text(
-        f"✅ Пост обновлён на <b>{post_info['time_str']}</b>",
-        reply_markup=get_main_menu()
-    )
     await state.clear()
+    summary = report.summary(IMPORT_REPORT_LIMIT)
+    if shifted:
+        first, _, rest = summary.partition("\n")
+        summary = f"{first}\nСдвинуто на ближайшее свободное время: {shifted}" + (f"\n{rest}" if rest else "")
+    await message.answer(escape(summary), reply_markup=get_main_menu())
+    if len(report.errors) > IMPORT_REPORT_LIMIT:
+        await message.answer_document(BufferedInputFile(
+            report.error_log().encode(), filename=f"import_errors_{batch}.tsv",
+        ))
 
 
-async def main():
-    await bot.delete_webhook(drop_pending_updates=True)
+@router.message(ImportForm.file)
+async def process_import_other(message: Message):
+    await message.answer("Пришлите файл .csv, .json или .jsonl документом.")
+
+
+router.callback_query.register(callbacks.dispatch)
 
-    # Очистка мёртвых постов при запуске
-    global scheduled_posts
-    active_job_ids = {job.id for job in scheduler.get_jobs()}
-    scheduled_posts = [p for p in scheduled_posts if p["job_id"] in active_job_ids]
-    save_scheduled_posts()
-    logging.info(f"После очистки осталось {len(scheduled_posts)} активных постов")
 
+# ─── Запуск: общие хуки для polling и webhook ───
+async def on_startup(bot: Bot):
+    global load_task
+    if load_cursor is not None:
+        load_task = asyncio.create_task(load_remaining())
+    scheduler.add_job(
+        refill_jobs, "interval", seconds=config.job_horizon.total_seconds() / 2,
+        id="refill_jobs", replace_existing=True,
+    )
+    scheduler.add_job(
+        fsm_storage.purge_expired, "interval", hours=1,
+        id="purge_fsm", replace_existing=True,
+    )
+    scheduler.add_job(
+        retry_deliveries, "interval", seconds=config.outbox_retry_tick,
+        id="retry_deliveries", replace_existing=True,
+    )
+    scheduler.add_job(
+        lambda: outbox.prune(time.time() - config.outbox_keep.total_seconds()), "interval", hours=1,
+        id="prune_outbox", replace_existing=True,
+    )
+    # Журнал изменений пополняется при каждой записи, даже у единственного экземпляра
+    scheduler.add_job(
+        lambda: store.prune_changes(config.store_changes_keep.total_seconds()), "interval", minutes=10,
+        id="prune_changes", replace_existing=True,
+    )
+    if coordinator.backend:
+        scheduler.add_job(
+            sync_from_store, "interval", seconds=config.sync_interval,
+            id="sync_from_store", replace_existing=True,
+        )
+        scheduler.add_job(
+            coordinator.prune, "interval", hours=1,
+            id="prune_claims", replace_existing=True,
+        )
+    publisher.start()
+    if config.prewarm_lead:
+        warmer.start()
     scheduler.start()
     logging.info("Планировщик запущен")
+
+    await coordinator.start(on_elected=become_leader, on_demoted=step_down)
+
+    if config.metrics_listen_port:
+        await metrics.start_server(config.metrics_listen_host, config.metrics_listen_port)
+
+
+async def on_shutdown(bot: Bot):
+    if load_task and not load_task.done():
+        load_task.cancel()
+    for waiting in album_waits.values():
+        waiting.cancel()
+    await metrics.stop_server()
+    await coordinator.stop()
+    scheduler.shutdown(wait=False)
+    await warmer.stop()
+    await publisher.stop()
+    outbox.close()
+    await asyncio.to_thread(store_writer.close)
+    store.close()
+    await fsm_storage.close()
+    logging.info("Планировщик остановлен")
+
+
+# ─── Сборка приложения ───
+def create_app(cfg: Config) -> Dispatcher:
+    # Создаёт бота, диспетчер, хранилища и планировщик по настройкам и читает
+    # из хранилища ближайшие посты; остальные дочитывает load_remaining,
+    # которую запускает on_startup
+    global config, bot, dp, fsm_storage, update_queue, scheduler, publisher, misfires
+    global store, store_seq, store_writer, registry, coordinator, outbox, allocator, search_index, file_cache, warmer
+    global metrics, publish_lag, handler_latency, store_write_time, api_latency, load_cursor, load_done
+    config = cfg
+
+    bot = Bot(
+        token=config.bot_token,
+        session=TunedAiohttpSession(
+            limit=config.bot_pool_size, keepalive=config.bot_keepalive, timeout=config.bot_request_timeout,
+            dns_ttl=config.bot_dns_ttl,
+        ),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    fsm_storage = SQLiteStorage(
+        config.fsm_storage_path, ttl=config.fsm_draft_ttl.total_seconds(), max_cached=config.fsm_max_cached,
+    )
+    dp = Dispatcher(storage=fsm_storage)
+    update_queue = ChatQueueMiddleware(
+        config.update_concurrency, config.update_chat_queue, config.update_max_pending,
+        config.duplicate_callback_window,
+    )
+    # Пропущенные запуски не отбрасываются планировщиком: что с ними делать,
+    # решает publish_post по config.misfire_policy
+    scheduler = AsyncIOScheduler(job_defaults={"misfire_grace_time": None, "coalesce": True})
+    publisher = Publisher()
+    misfires = deque(maxlen=config.misfire_report_size)
+
+    # Загрузка сохранённых постов: сейчас — только до конца горизонта
+    store = open_store(config.post_store_backend, config.post_store_path)
+    migrate_from_json(config.scheduled_posts_file, store)
+    store_seq = store.last_change()
+    horizon = (datetime.now() + config.job_horizon).isoformat()
+    registry = PostRegistry(store.due_before(horizon))
+    load_cursor = (horizon, "\uffff")
+    load_done = asyncio.Event()
+    coordinator = Coordinator(SQLiteLockBackend(config.coordination_path) if config.coordination_path else None)
+    outbox = Outbox(config.outbox_path, config.outbox_retry_schedule)
+    allocator = SlotAllocator(config.channels, config.post_spacing, config.channel_spacing, posts=registry)
+    search_index = SearchIndex(registry)
+    file_cache = FileCache(config.file_cache_size)
+    warmer = ConnectionWarmer(
+        bot, next_burst, lead=config.prewarm_lead.total_seconds() if config.prewarm_lead else 0,
+        max_connections=min(publisher.concurrency, config.bot_pool_size),
+    )
+
+    metrics = MetricsRegistry()
+    publish_lag = metrics.histogram(
+        "post_publish_lag_seconds", "Задержка фактической публикации относительно запланированного времени",
+        ["connection"], buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300, 900),
+    )
+    handler_latency = metrics.histogram("handler_latency_seconds", "Время работы обработчика", ["handler"])
+    store_write_time = metrics.histogram("store_write_seconds", "Время записи в хранилище постов", ["op"])
+    api_latency = metrics.histogram("bot_api_request_seconds", "Время запроса к Bot API", ["method"])
+    metrics.gauge("scheduled_posts", "Постов в очереди", lambda: len(registry))
+    metrics.gauge("publisher_queue_depth", "Отправок в очереди publisher", lambda: publisher.depth)
+    metrics.gauge("scheduler_jobs", "Задач в планировщике", lambda: len(scheduler.get_jobs()))
+    metrics.gauge("fsm_sessions", "Сохранённых FSM-сессий", lambda: fsm_storage.count())
+    metrics.gauge(
+        "bot_connections_opened", "Новых соединений с Bot API с запуска", lambda: getattr(bot.session, "opened", 0),
+    )
+    metrics.gauge("update_queue_pending", "Апдейтов в очередях чатов", lambda: update_queue.pending)
+    metrics.gauge("updates_shed", "Апдейтов отклонено из-за перегрузки с запуска", lambda: update_queue.shed)
+    metrics.gauge("callbacks_deduplicated", "Повторных нажатий отброшено с запуска", lambda: update_queue.duplicates)
+    metrics.gauge("outbox_retry", "Отправок, ожидающих повтора", lambda: outbox.counts().get("retry", 0))
+    metrics.gauge("outbox_dead", "Отправок в «Неотправленных»", lambda: outbox.counts().get("dead", 0))
+    metrics.gauge("store_pending_writes", "Изменений, ожидающих записи в хранилище", lambda: store_writer.pending)
+    metrics.gauge("file_cache_hits", "Медиа, отправленных по file_id из кэша, с запуска", lambda: file_cache.hits)
+
+    # Запись в хранилище идёт из фонового потока; обработчики только ставят изменения в очередь
+    store_writer = WriteBehind(
+        store, config.store_flush_window, on_flush=lambda seconds, count: store_write_time.observe(seconds, "flush"),
+    )
+
+    # Очередь должна стоять перед FSMContextMiddleware: тот читает состояние FSM
+    # заранее, и апдейт, дождавшийся своей очереди, видел бы устаревшее
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(update_queue)
+    dp.update.outer_middleware(dp.fsm)
+    dp.message.middleware(HandlerMetricsMiddleware(handler_latency))
+    dp.callback_query.middleware(HandlerMetricsMiddleware(handler_latency, callbacks))
+    bot.session.middleware(RequestMetricsMiddleware(api_latency))
+
+    dp.include_router(app_router())
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+def app_router() -> Router:
+    # Router подключается только к одному диспетчеру, поэтому каждое
+    # приложение получает свой с теми же обработчиками — create_app можно
+    # вызывать в одном процессе повторно (тесты, инструменты)
+    fresh = Router(name="bot")
+    for name, observer in router.observers.items():
+        fresh.observers[name].handlers.extend(observer.handlers)
+    return fresh
+
+
+async def run_polling():
+    await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
 
 
+def create_webhook_app(secret: str, handle_in_background: bool = True) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=handle_in_background,
+    ).register(app, path=config.webhook_path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def run_webhook():
+    secret = config.webhook_secret or secrets.token_urlsafe(32)
+
+    async def set_webhook(bot: Bot):
+        await bot.set_webhook(
+            config.webhook_base_url + config.webhook_path, secret_token=secret, drop_pending_updates=True,
+        )
+        logging.info(f"Webhook установлен: {config.webhook_base_url + config.webhook_path}")
+
+    dp.startup.register(set_webhook)
+    web.run_app(create_webhook_app(secret), host=config.webhook_listen_host, port=config.webhook_listen_port)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    create_app(Config.from_env())
+    if config.run_mode == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(run_polling())
+
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    main()
@@ -0,0 +1,157 @@
+import bisect
+import logging
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery
+from aiohttp import web
+
+from callbacks import unpack
+
+
+# ─── Метрики в формате Prometheus ───
+# Гистограммы и gauge'и без внешних зависимостей; отдаются по HTTP на /metrics.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}       # значения меток -> [счётчики по корзинам, сумма, количество]
+
+    def observe(self, value: float, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _labels(self.labelnames + ("le",), labelvalues + (f"{bound:g}",))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.labelnames + ("le",), labelvalues + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class Gauge:
+    # Значение вычисляется функцией в момент запроса /metrics
+    def __init__(self, name: str, help: str, func):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            yield f"{self.name} {self.func()}"
+        except Exception as e:
+            logging.error(f"Ошибка вычисления метрики {self.name}: {e}")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._runner = None
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, func) -> Gauge:
+        metric = Gauge(name, help, func)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, request: web.Request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start_server(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+    async def stop_server(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# ─── Middleware ───
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Внутренний middleware: время работы каждого обработчика. Для callback-кнопок
+    # все вызовы идут через один CallbackRouter, поэтому меткой служит action
+    # (неизвестные action сводятся в одну метку, чтобы не раздувать число серий).
+    def __init__(self, histogram: Histogram, callbacks=()):
+        self.histogram = histogram
+        self.callbacks = callbacks
+
+    async def __call__(self, handler, event, data):
+        if isinstance(event, CallbackQuery):
+            action = unpack(event.data)[0]
+            name = "cb:" + (action if action in self.callbacks else "unknown")
+        else:
+            name = data["handler"].callback.__name__
+        with self.histogram.time(name):
+            return await handler(event, data)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    async def __call__(self, make_request, bot, method):
+        with self.histogram.time(type(method).__name__):
+            return await make_request(bot, method)
@@ -0,0 +1,211 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from post_model import Post, decode, encode
+
+
+# ─── Журнал отправок (outbox) ───
+# Каждая отправка поста в канал оставляет запись: удачная — со статусом sent
+# и message_id в канале, неудачная — retry с временем следующей попытки по
+# retry_schedule. Когда попытки кончаются (или ошибка заведомо не лечится
+# повтором — нет прав, чат не найден), запись становится dead и ждёт решения
+# админа в меню «Неотправленные».
+#
+# Ключ записи — (occurrence, chat_id): occurrence — job_id поста, для серии
+# job_id@время срабатывания. По нему же ищется message_id опубликованного
+# поста, все отправки поста — по индексу job_id.
+
+RETRY_SCHEDULE = (60, 300, 1800, 7200)      # паузы перед повторами, с
+RETRIABLE = (TelegramNetworkError, TelegramServerError, TelegramRetryAfter)
+ERROR_LENGTH = 500
+
+
+@dataclass(slots=True)
+class Delivery:
+    id: int
+    occurrence: str
+    chat_id: int
+    status: str                 # sent / retry / dead
+    attempts: int
+    next_retry: float | None
+    message_id: int | None
+    error: str | None
+    updated: float
+    post: Post
+
+
+class Outbox:
+    def __init__(self, path: str, retry_schedule=RETRY_SCHEDULE):
+        self.retry_schedule = tuple(retry_schedule)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                occurrence TEXT NOT NULL,
+                job_id     TEXT NOT NULL,
+                chat_id    INTEGER NOT NULL,
+                status     TEXT NOT NULL,
+                attempts   INTEGER NOT NULL DEFAULT 0,
+                next_retry REAL,
+                message_id INTEGER,
+                error      TEXT,
+                updated    REAL NOT NULL,
+                post       TEXT NOT NULL,
+                UNIQUE (occurrence, chat_id)
+            );
+            CREATE INDEX IF NOT EXISTS deliveries_job ON deliveries(job_id);
+            CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries(status, next_retry);
+        """)
+        # Чтения идут через отдельное соединение: в WAL они не ждут записи,
+        # и проверка перед публикацией не стоит в очереди за чужим COMMIT
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+
+    _COLUMNS = "id, occurrence, chat_id, status, attempts, next_retry, message_id, error, updated, post"
+
+    @staticmethod
+    def _delivery(row) -> Delivery:
+        return Delivery(*row[:-1], decode(row[-1]))
+
+    def _tx(self, work):
+        # work(conn) выполняется в одной транзакции BEGIN IMMEDIATE
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def record(self, occurrence: str, post: Post, results: dict, now: float = None) -> list:
+        # results: chat_id -> message_id или исключение. Возвращает chat_id,
+        # отправки в которые только что стали dead
+        now = now or time.time()
+        data = encode(post)
+
+        def work(conn):
+            dead = []
+            for chat_id, result in results.items():
+                if not isinstance(result, Exception):
+                    conn.execute(
+                        "INSERT INTO deliveries (occurrence, job_id, chat_id, status, attempts, message_id, "
+                        "updated, post) VALUES (?, ?, ?, 'sent', 1, ?, ?, ?) "
+                        "ON CONFLICT(occurrence, chat_id) DO UPDATE SET status = 'sent', "
+                        "attempts = deliveries.attempts + 1, next_retry = NULL, message_id = excluded.message_id, "
+                        "error = NULL, updated = excluded.updated, post = excluded.post",
+                        (occurrence, post.job_id, chat_id, result, now, data),
+                    )
+                    continue
+                row = conn.execute(
+                    "SELECT attempts FROM deliveries WHERE occurrence = ? AND chat_id = ?", (occurrence, chat_id),
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                if isinstance(result, RETRIABLE) and attempts <= len(self.retry_schedule):
+                    status, next_retry = "retry", now + self.retry_schedule[attempts - 1]
+                else:
+                    status, next_retry = "dead", None
+                    dead.append(chat_id)
+                error = f"{type(result).__name__}: {result}"[:ERROR_LENGTH]
+                conn.execute(
+                    "INSERT INTO deliveries (occurrence, job_id, chat_id, status, attempts, next_retry, error, "
+                    "updated, post) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(occurrence, chat_id) DO UPDATE SET status = excluded.status, "
+                    "attempts = excluded.attempts, next_retry = excluded.next_retry, error = excluded.error, "
+                    "updated = excluded.updated, post = excluded.post",
+                    (occurrence, post.job_id, chat_id, status, attempts, next_retry, error, now, data),
+                )
+            return dead
+
+        return self._tx(work)
+
+    def take_due(self, now: float = None, limit: int = 50, lease: float = 120.0) -> list:
+        # Повторы, время которых пришло. Взятые записи откладываются на lease,
+        # чтобы следующий проход не отправил их второй раз, пока идёт этот
+        now = now or time.time()
+
+        def work(conn):
+            rows = conn.execute(
+                f"SELECT {self._COLUMNS} FROM deliveries WHERE status = 'retry' AND next_retry <= ? "
+                "ORDER BY next_retry LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany("UPDATE deliveries SET next_retry = ? WHERE id = ?", [(now + lease, r[0]) for r in rows])
+            return rows
+
+        return [self._delivery(r) for r in self._tx(work)]
+
+    def delivered(self, occurrence: str) -> dict:
+        # chat_id -> message_id для уже отправленных копий этого срабатывания
+        rows = self._query(
+            "SELECT chat_id, message_id FROM deliveries WHERE occurrence = ? AND status = 'sent'", (occurrence,),
+        )
+        return dict(rows)
+
+    def sent(self, occurrence: str, chat_id: int):
+        rows = self._query(
+            "SELECT message_id FROM deliveries WHERE occurrence = ? AND chat_id = ? AND status = 'sent'",
+            (occurrence, chat_id),
+        )
+        return rows[0][0] if rows else None
+
+    def published(self, job_id: str) -> list:
+        # Все отправленные копии поста (для серии — всех срабатываний)
+        rows = self._query(
+            f"SELECT {self._COLUMNS} FROM deliveries WHERE job_id = ? AND status = 'sent' ORDER BY id", (job_id,),
+        )
+        return [self._delivery(r) for r in rows]
+
+    def get(self, delivery_id: int):
+        rows = self._query(f"SELECT {self._COLUMNS} FROM deliveries WHERE id = ?", (delivery_id,))
+        return self._delivery(rows[0]) if rows else None
+
+    def dead(self, offset: int = 0, limit: int = 5) -> list:
+        rows = self._query(
+            f"SELECT {self._COLUMNS} FROM deliveries WHERE status = 'dead' ORDER BY updated DESC, id DESC "
+            "LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [self._delivery(r) for r in rows]
+
+    def counts(self) -> dict:
+        return dict(self._query("SELECT status, COUNT(*) FROM deliveries GROUP BY status"))
+
+    def requeue(self, delivery_id: int = None, now: float = None) -> int:
+        # Вернуть dead-запись (None — все) в очередь повторов с нуля попыток
+        now = now or time.time()
+        sql = "UPDATE deliveries SET status = 'retry', attempts = 0, next_retry = ?, updated = ? WHERE status = 'dead'"
+        params = (now, now)
+        if delivery_id is not None:
+            sql += " AND id = ?"
+            params += (delivery_id,)
+        return self._tx(lambda conn: conn.execute(sql, params).rowcount)
+
+    def drop(self, delivery_id: int) -> bool:
+        return self._tx(lambda conn: conn.execute(
+            "DELETE FROM deliveries WHERE id = ? AND status = 'dead'", (delivery_id,),
+        ).rowcount) > 0
+
+    def prune(self, older_than: float):
+        # Отправленные записи старше older_than больше не нужны для правок
+        self._tx(lambda conn: conn.execute(
+            "DELETE FROM deliveries WHERE status = 'sent' AND updated < ?", (older_than,),
+        ))
+
+    def close(self):
+        with self._read_lock:
+            self._reader.close()
+        with self._lock:
+            self._conn.close()
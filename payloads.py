@@ -0,0 +1,216 @@
+import re
+from html import unescape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from aiogram.enums import ParseMode
+from aiogram.methods import (
+    CopyMessage, CopyMessages, SendDocument, SendMediaGroup, SendMessage, SendPhoto, SendVideo,
+)
+from aiogram.types import (
+    InlineKeyboardButton, InlineKeyboardMarkup, InputMediaDocument, InputMediaPhoto, InputMediaVideo,
+)
+
+from post_model import Post
+
+
+# ─── Готовые запросы публикации ───
+# Запрос к Bot API собирается и проверяется один раз — при планировании и
+# редактировании, а не в момент срабатывания. Всё, что Telegram отверг бы
+# (разметка, длина текста или подписи, кнопки), отклоняется до постановки в
+# очередь; при срабатывании остаётся подставить chat_id и отправить.
+#
+# Длины считаются в UTF-16 (как смещения сущностей в Bot API) по видимому
+# тексту после разбора HTML — с запасом для эмодзи и редких символов.
+#
+# Альбом уходит одним sendMediaGroup (подпись — у первого элемента), в
+# остальные каналы — одним copyMessages. Кнопок у альбома быть не может:
+# Telegram не прикрепляет клавиатуру к группе сообщений.
+
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+ALBUM_MIN = 2
+ALBUM_MAX = 10
+MEDIA_TYPES = ("photo", "video", "document")
+ROW_LIMIT = 8               # кнопок в ряду
+BUTTONS_LIMIT = 100         # кнопок в клавиатуре
+URL_SCHEMES = ("http", "https", "tg")
+
+_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "a",
+    "code", "pre", "span", "tg-spoiler", "tg-emoji", "blockquote",
+}
+_BAD_AMPERSAND = re.compile(r"&(?!(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);)")
+
+
+class _EntityParser(HTMLParser):
+    # Проверяет разметку по правилам parse_mode=HTML и собирает видимый текст.
+    # Сущности разбираются отдельно: в handle_data приходит исходный текст,
+    # и &lt; не путается с неэкранированным <
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag not in _TAGS:
+            raise ValueError(f"Тег <{tag}> не поддерживается Telegram")
+        if tag == "a" and not attrs.get("href"):
+            raise ValueError("У ссылки <a> нет href")
+        if tag == "span" and attrs.get("class") != "tg-spoiler":
+            raise ValueError('Тег <span> допустим только с class="tg-spoiler"')
+        if tag == "tg-emoji" and not attrs.get("emoji-id"):
+            raise ValueError("У <tg-emoji> нет emoji-id")
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        raise ValueError(f"Тег <{tag}/> не поддерживается Telegram")
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack[-1] != tag:
+            raise ValueError(f"Лишний или незакрытый тег: </{tag}>")
+        self.stack.pop()
+
+    def handle_data(self, data):
+        if "<" in data or ">" in data:
+            raise ValueError("Символы < и > вне тегов нужно экранировать (&lt; &gt;)")
+        self.parts.append(data)
+
+    def handle_entityref(self, name):
+        self.parts.append(unescape(f"&{name};"))
+
+    def handle_charref(self, name):
+        self.parts.append(unescape(f"&#{name};"))
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def visible_text(html_text: str) -> str:
+    if _BAD_AMPERSAND.search(html_text):
+        raise ValueError("Символ & вне HTML-сущности нужно экранировать (&amp;)")
+    parser = _EntityParser()
+    parser.feed(html_text)
+    parser.close()
+    if parser.stack:
+        raise ValueError(f"Незакрытый тег: <{parser.stack[-1]}>")
+    if parser.rawdata:
+        raise ValueError("Оборванный тег в конце текста")
+    return "".join(parser.parts)
+
+
+def check_buttons(rows):
+    if not rows:
+        return
+    total = 0
+    for row in rows:
+        if not row:
+            raise ValueError("Пустой ряд кнопок")
+        if len(row) > ROW_LIMIT:
+            raise ValueError(f"В ряду не больше {ROW_LIMIT} кнопок")
+        for button in row:
+            if not button.get("text", "").strip():
+                raise ValueError("У кнопки нет текста")
+            url = urlsplit(button.get("url", ""))
+            if url.scheme not in URL_SCHEMES or (url.scheme != "tg" and not url.netloc):
+                raise ValueError(f"Недопустимая ссылка кнопки: {button.get('url', '')}")
+        total += len(row)
+    if total > BUTTONS_LIMIT:
+        raise ValueError(f"Не больше {BUTTONS_LIMIT} кнопок")
+
+
+def check_album(items):
+    if not ALBUM_MIN <= len(items or ()) <= ALBUM_MAX:
+        raise ValueError(f"В альбоме от {ALBUM_MIN} до {ALBUM_MAX} файлов, сейчас {len(items or ())}")
+    for item in items:
+        if item.get("type") not in MEDIA_TYPES or not item.get("id"):
+            raise ValueError(f"Элемент альбома — {', '.join(MEDIA_TYPES)} с file_id или ссылкой")
+    documents = sum(item["type"] == "document" for item in items)
+    if documents and documents != len(items):
+        raise ValueError("Документы в альбоме нельзя смешивать с фото и видео")
+
+
+def check_content(text, media_type=None, buttons=None):
+    # ValueError с понятным админу текстом, если Telegram отверг бы такой пост
+    if media_type == "album" and buttons:
+        raise ValueError("К альбому нельзя прикрепить кнопки")
+    visible = visible_text(text or "")
+    if media_type:
+        if utf16_len(visible) > CAPTION_LIMIT:
+            raise ValueError(f"Подпись к медиа — не больше {CAPTION_LIMIT} символов, сейчас {utf16_len(visible)}")
+    else:
+        if not visible.strip():
+            raise ValueError("Текст не может быть пустым.")
+        if utf16_len(visible) > TEXT_LIMIT:
+            raise ValueError(f"Текст — не больше {TEXT_LIMIT} символов, сейчас {utf16_len(visible)}")
+    check_buttons(buttons)
+
+
+def build_markup(rows):
+    if not rows:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=b["text"], url=b["url"]) for b in row] for row in rows
+    ])
+
+
+_INPUT_MEDIA = {"photo": InputMediaPhoto, "video": InputMediaVideo, "document": InputMediaDocument}
+
+
+def sent_message_id(sent) -> int:
+    # sendMediaGroup и copyMessages возвращают список — пост определяет первое сообщение
+    return sent[0].message_id if isinstance(sent, list) else sent.message_id
+
+
+class PreparedPost:
+    # Проверенный запрос-шаблон; for_chat() только подставляет chat_id и, если
+    # передан кэш file_id, уже загруженные файлы вместо ссылок
+    __slots__ = ("post", "method", "markup", "sources")
+
+    def __init__(self, post: Post):
+        check_content(post.text, post.media_type, post.buttons)
+        self.post = post
+        self.markup = build_markup(post.buttons)
+        text = post.text or None
+        if post.media_type == "album":
+            check_album(post.album)
+            self.sources = [item["id"] for item in post.album]
+            self.method = SendMediaGroup(chat_id=0, media=[
+                _INPUT_MEDIA[item["type"]](media=item["id"], caption=text if i == 0 else None,
+                                           parse_mode=ParseMode.HTML)
+                for i, item in enumerate(post.album)
+            ])
+            return
+        self.sources = [post.media_id] if post.media_type else []
+        if post.media_type == "photo":
+            self.method = SendPhoto(chat_id=0, photo=post.media_id, caption=text,
+                                    parse_mode=ParseMode.HTML, reply_markup=self.markup)
+        elif post.media_type == "video":
+            self.method = SendVideo(chat_id=0, video=post.media_id, caption=text,
+                                    parse_mode=ParseMode.HTML, reply_markup=self.markup)
+        elif post.media_type == "document":
+            self.method = SendDocument(chat_id=0, document=post.media_id, caption=text,
+                                       parse_mode=ParseMode.HTML, reply_markup=self.markup)
+        else:
+            self.method = SendMessage(chat_id=0, text=post.text,
+                                      parse_mode=ParseMode.HTML, reply_markup=self.markup)
+
+    def for_chat(self, chat_id, files=None):
+        update = {"chat_id": chat_id}
+        resolved = [files.resolve(ref) for ref in self.sources] if files is not None else self.sources
+        if resolved != self.sources:
+            if isinstance(self.method, SendMediaGroup):
+                update["media"] = [m.model_copy(update={"media": r}) for m, r in zip(self.method.media, resolved)]
+            else:
+                update[self.post.media_type] = resolved[0]
+        return self.method.model_copy(update=update)
+
+    def copy_for(self, chat_id, from_chat_id, sent):
+        # Копия уже опубликованного в from_chat_id поста: файлы не загружаются повторно
+        if isinstance(sent, list):
+            return CopyMessages(chat_id=chat_id, from_chat_id=from_chat_id,
+                                message_ids=[m.message_id for m in sent])
+        return CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=sent.message_id,
+                           reply_markup=self.markup)
@@ -0,0 +1,106 @@
+import json
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from html import escape
+
+try:
+    import orjson
+except ImportError:         # необязательная зависимость: без неё — стандартный json
+    orjson = None
+
+
+# ─── Модель отложенного поста ───
+# Post — единственное представление поста: его хранят реестр и хранилище,
+# по нему публикуют и рисуют списки. Полное HTML-содержимое, медиа, кнопки
+# (ряды {"text", "url"}), каналы и правило повтора хранятся как есть;
+# альбом — media_type "album" и список элементов {"type", "id"} в album;
+# производные поля для отображения считаются один раз при создании.
+#
+# Сериализация — позиционный массив с номером версии: короче словаря
+# и быстрее разбирается. Записи старых форматов (словари, версия 1 без
+# альбома) читаются тоже.
+
+PREVIEW_LENGTH = 80
+ROW_VERSION = 2
+
+
+def dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def make_preview(text) -> str:
+    if not text:
+        return "[без текста]"
+    return escape(text[:PREVIEW_LENGTH] + ("..." if len(text) > PREVIEW_LENGTH else ""))
+
+
+@dataclass(slots=True)
+class Post:
+    job_id: str
+    user_id: int | None
+    when: datetime
+    text: str | None                    # None — запись старого формата без содержимого
+    media_type: str | None = None       # photo / video / document / album
+    media_id: str | None = None         # file_id или URL; у альбома — None
+    album: list | None = None           # элементы альбома: {"type", "id"}
+    buttons: list | None = None
+    targets: list | None = None         # None — все каналы
+    repeat: dict | None = None
+    time_iso: str = field(init=False, compare=False, repr=False)
+    time_str: str = field(init=False, compare=False, repr=False)
+    text_preview: str = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        self.time_iso = self.when.isoformat()
+        w = self.when       # то же, что strftime("%d.%m.%Y в %H:%M"), но в разы быстрее
+        self.time_str = f"{w.day:02d}.{w.month:02d}.{w.year} в {w.hour:02d}:{w.minute:02d}"
+        self.text_preview = make_preview(self.text)
+
+    @property
+    def has_media(self) -> bool:
+        return bool(self.media_type)
+
+    @property
+    def has_buttons(self) -> bool:
+        return bool(self.buttons)
+
+    def retimed(self, when: datetime) -> "Post":
+        return replace(self, when=when)
+
+    def to_row(self) -> list:
+        return [
+            ROW_VERSION, self.job_id, self.user_id, self.time_iso, self.text,
+            self.media_type, self.media_id, self.album, self.buttons, self.targets, self.repeat,
+        ]
+
+    @classmethod
+    def from_row(cls, row) -> "Post":
+        if isinstance(row, dict):
+            return cls(
+                row["job_id"], row.get("user_id"), datetime.fromisoformat(row["time_iso"]), row.get("text"),
+                row.get("media_type"), row.get("media_id"), row.get("album"), row.get("buttons"),
+                row.get("targets"), row.get("repeat"),
+            )
+        if row[0] == 1:
+            row = [ROW_VERSION, *row[1:7], None, *row[7:]]
+        version, job_id, user_id, time_iso, text, media_type, media_id, album, buttons, targets, repeat = row
+        if version != ROW_VERSION:
+            raise ValueError(f"Неизвестная версия записи поста: {version}")
+        return cls(
+            job_id, user_id, datetime.fromisoformat(time_iso), text,
+            media_type, media_id, album, buttons, targets, repeat,
+        )
+
+
+def encode(post: Post) -> str:
+    return dumps(post.to_row())
+
+
+def decode(raw) -> Post:
+    return Post.from_row(loads(raw))
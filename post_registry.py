@@ -0,0 +1,96 @@
+import bisect
+
+from post_model import Post
+
+
+# ─── Реестр отложенных постов в памяти ───
+# Индексы:
+#   _by_id   — job_id -> пост, O(1)
+#   _by_time — отсортированный список (time_iso, job_id) для списков и «ближайших N», O(log n) поиск
+#   _by_user — user_id -> множество job_id
+
+
+class PostRegistry:
+    def __init__(self, posts=()):
+        self._by_id = {}
+        self._by_time = []
+        self._by_user = {}
+        for post in posts:
+            self._by_id[post.job_id] = post
+            self._by_user.setdefault(post.user_id, set()).add(post.job_id)
+        self._by_time = sorted((p.time_iso, p.job_id) for p in self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __bool__(self):
+        return bool(self._by_id)
+
+    def __contains__(self, job_id: str):
+        return job_id in self._by_id
+
+    def __iter__(self):
+        # В порядке времени публикации
+        for _, job_id in self._by_time:
+            yield self._by_id[job_id]
+
+    def get(self, job_id: str):
+        return self._by_id.get(job_id)
+
+    def add(self, post: Post):
+        job_id = post.job_id
+        if job_id in self._by_id:
+            self.remove(job_id)
+        self._by_id[job_id] = post
+        bisect.insort(self._by_time, (post.time_iso, job_id))
+        self._by_user.setdefault(post.user_id, set()).add(job_id)
+
+    def remove(self, job_id: str):
+        post = self._by_id.pop(job_id, None)
+        if post is None:
+            return None
+        key = (post.time_iso, job_id)
+        i = bisect.bisect_left(self._by_time, key)
+        if i < len(self._by_time) and self._by_time[i] == key:
+            del self._by_time[i]
+        user_posts = self._by_user.get(post.user_id)
+        if user_posts is not None:
+            user_posts.discard(job_id)
+            if not user_posts:
+                del self._by_user[post.user_id]
+        return post
+
+    def position(self, job_id: str) -> int:
+        # Индекс поста в упорядоченном по времени списке, -1 если его нет
+        post = self._by_id.get(job_id)
+        if post is None:
+            return -1
+        return bisect.bisect_left(self._by_time, (post.time_iso, job_id))
+
+    def job_ids(self, start: int, stop: int) -> list:
+        return [job_id for _, job_id in self._by_time[start:stop]]
+
+    def slice(self, start: int, stop: int) -> list:
+        return [self._by_id[job_id] for _, job_id in self._by_time[start:stop]]
+
+    def next_due(self, n: int, after_iso: str = "") -> list:
+        start = bisect.bisect_right(self._by_time, (after_iso, "\uffff")) if after_iso else 0
+        return self.slice(start, start + n)
+
+    def span(self, start_iso: str, end_iso: str):
+        # Границы [start, end) постов со временем в [start_iso, end_iso] для slice
+        start = bisect.bisect_left(self._by_time, (start_iso, ""))
+        end = bisect.bisect_right(self._by_time, (end_iso, "\uffff"))
+        return start, end
+
+    def between(self, start_iso: str, end_iso: str) -> list:
+        # Посты со временем в [start_iso, end_iso]
+        return self.slice(*self.span(start_iso, end_iso))
+
+    def due_before(self, time_iso: str) -> list:
+        end = bisect.bisect_right(self._by_time, (time_iso, "\uffff"))
+        return self.slice(0, end)
+
+    def for_user(self, user_id: int) -> list:
+        job_ids = self._by_user.get(user_id, ())
+        return sorted((self._by_id[j] for j in job_ids), key=lambda p: p.time_iso)
@@ -0,0 +1,469 @@
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from post_model import Post, decode, dumps, encode, loads
+
+
+# ─── Хранилище отложенных постов ───
+# Каждая запись — Post (post_model.py), на диске — его компактная строка.
+# Все операции точечные: вставка/обновление/удаление одного поста не
+# переписывает остальные.
+
+
+class PostStore:
+    def load_all(self) -> list:
+        raise NotImplementedError
+
+    def get(self, job_id: str):
+        raise NotImplementedError
+
+    def upsert(self, post: Post):
+        raise NotImplementedError
+
+    def upsert_many(self, posts):
+        for post in posts:
+            self.upsert(post)
+
+    def delete(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def write_batch(self, posts, job_ids):
+        # Пакет вставок и удалений; хранилища ниже пишут его одной транзакцией
+        self.upsert_many(posts)
+        for job_id in job_ids:
+            self.delete(job_id)
+
+    def due_before(self, time_iso: str) -> list:
+        raise NotImplementedError
+
+    def load_after(self, time_iso: str, job_id: str, limit: int) -> list:
+        # Следующие limit постов после (time_iso, job_id) в порядке времени —
+        # для загрузки очереди порциями
+        raise NotImplementedError
+
+    def last_change(self) -> int:
+        return 0
+
+    def changes_since(self, seq: int):
+        # (последний seq, [(job_id, текущая запись или None если удалён)]) —
+        # для синхронизации нескольких процессов над одним хранилищем
+        return seq, []
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def prune_changes(self, keep: float):
+        # Забывает изменения старше keep секунд: их уже прочитали все экземпляры
+        pass
+
+    def compact(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLitePostStore(PostStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Журнал изменений заполняется триггерами в той же транзакции, что и
+        # сама запись, — другие процессы читают его через changes_since()
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                job_id   TEXT PRIMARY KEY,
+                time_iso TEXT NOT NULL,
+                user_id  INTEGER,
+                data     TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS posts_time_job ON posts(time_iso, job_id);
+            DROP INDEX IF EXISTS posts_time_iso;
+
+            CREATE TABLE IF NOT EXISTS changes (
+                seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id  TEXT NOT NULL,
+                changed INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            );
+            CREATE TRIGGER IF NOT EXISTS posts_ins AFTER INSERT ON posts
+                BEGIN INSERT INTO changes (job_id) VALUES (new.job_id); END;
+            CREATE TRIGGER IF NOT EXISTS posts_upd AFTER UPDATE ON posts
+                BEGIN INSERT INTO changes (job_id) VALUES (new.job_id); END;
+            CREATE TRIGGER IF NOT EXISTS posts_del AFTER DELETE ON posts
+                BEGIN INSERT INTO changes (job_id) VALUES (old.job_id); END;
+        """)
+
+    _UPSERT = (
+        "INSERT INTO posts (job_id, time_iso, user_id, data) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(job_id) DO UPDATE SET "
+        "time_iso = excluded.time_iso, user_id = excluded.user_id, data = excluded.data"
+    )
+    _DELETE = "DELETE FROM posts WHERE job_id = ?"
+
+    def _write(self, *statements):
+        # statements: (sql, rows); все — в одной транзакции
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rowcount = 0
+                for sql, rows in statements:
+                    rowcount += self._conn.executemany(sql, rows).rowcount
+                self._conn.execute("COMMIT")
+                return rowcount
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _row(post: Post):
+        return (post.job_id, post.time_iso, post.user_id, encode(post))
+
+    def load_all(self) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM posts ORDER BY time_iso").fetchall()
+        return [decode(r[0]) for r in rows]
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM posts WHERE job_id = ?", (job_id,)).fetchone()
+        return decode(row[0]) if row else None
+
+    def upsert(self, post: Post):
+        self.upsert_many([post])
+
+    def upsert_many(self, posts):
+        self._write((self._UPSERT, [self._row(p) for p in posts]))
+
+    def delete(self, job_id: str) -> bool:
+        return self._write((self._DELETE, [(job_id,)])) > 0
+
+    def write_batch(self, posts, job_ids):
+        self._write(
+            (self._UPSERT, [self._row(p) for p in posts]),
+            (self._DELETE, [(job_id,) for job_id in job_ids]),
+        )
+
+    def due_before(self, time_iso: str) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM posts WHERE time_iso <= ? ORDER BY time_iso", (time_iso,)
+            ).fetchall()
+        return [decode(r[0]) for r in rows]
+
+    def load_after(self, time_iso: str, job_id: str, limit: int) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM posts WHERE (time_iso, job_id) > (?, ?) ORDER BY time_iso, job_id LIMIT ?",
+                (time_iso, job_id, limit),
+            ).fetchall()
+        return [decode(r[0]) for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def last_change(self) -> int:
+        # Из sqlite_sequence, а не MAX(seq): после чистки журнал может быть пуст
+        with self._lock:
+            row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes_since(self, seq: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.seq, c.job_id, p.data FROM changes c LEFT JOIN posts p ON p.job_id = c.job_id "
+                "WHERE c.seq > ? ORDER BY c.seq", (seq,)
+            ).fetchall()
+        latest = {}
+        for row_seq, job_id, data in rows:
+            seq = row_seq
+            latest[job_id] = decode(data) if data else None
+        return seq, list(latest.items())
+
+    def prune_changes(self, keep: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM changes WHERE changed < strftime('%s', 'now') - ?", (int(keep),))
+
+    def compact(self, keep_changes: int = 24 * 3600):
+        self.prune_changes(keep_changes)
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalPostStore(PostStore):
+    # Журнал — JSON Lines: {"op": "put", "post": [строка Post]} или {"op": "del", "job_id": "..."}.
+    # Каждая операция дописывается одной строкой; оборванная последняя строка
+    # (падение посреди записи) при загрузке отбрасывается.
+
+    def __init__(self, path: str, fsync: bool = True, compact_ratio: float = 2.0, compact_min: int = 1000):
+        self.path = path
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._lock = threading.Lock()
+        self._posts = {}
+        self._by_time = []          # отсортированный список (time_iso, job_id)
+        self._entries = 0           # строк в журнале, включая устаревшие
+        self._replay()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    entry = loads(raw)
+                except ValueError:
+                    break
+                if entry["op"] == "put":
+                    self._put(Post.from_row(entry["post"]))
+                else:
+                    self._del(entry["job_id"])
+                self._entries += 1
+                valid_size += len(raw)
+        if valid_size != os.path.getsize(self.path):
+            logging.warning(f"Журнал {self.path}: отброшен повреждённый хвост")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_size)
+
+    def _index_remove(self, post: Post):
+        key = (post.time_iso, post.job_id)
+        i = bisect.bisect_left(self._by_time, key)
+        if i < len(self._by_time) and self._by_time[i] == key:
+            del self._by_time[i]
+
+    def _put(self, post: Post):
+        old = self._posts.get(post.job_id)
+        if old is not None:
+            self._index_remove(old)
+        self._posts[post.job_id] = post
+        bisect.insort(self._by_time, (post.time_iso, post.job_id))
+
+    def _del(self, job_id: str):
+        old = self._posts.pop(job_id, None)
+        if old is not None:
+            self._index_remove(old)
+
+    @staticmethod
+    def _line(post: Post = None, job_id: str = None) -> str:
+        if post is not None:
+            return dumps({"op": "put", "post": post.to_row()}) + "\n"
+        return dumps({"op": "del", "job_id": job_id}) + "\n"
+
+    def _append(self, posts=(), job_ids=()):
+        data = "".join([self._line(post=p) for p in posts] + [self._line(job_id=j) for j in job_ids])
+        with self._lock:
+            self._fh.write(data)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            for post in posts:
+                self._put(post)
+            for job_id in job_ids:
+                self._del(job_id)
+            self._entries += len(posts) + len(job_ids)
+            need_compact = (
+                self._entries >= self.compact_min
+                and self._entries > self.compact_ratio * max(len(self._posts), 1)
+            )
+        if need_compact:
+            self.compact()
+
+    def load_all(self) -> list:
+        with self._lock:
+            return [self._posts[job_id] for _, job_id in self._by_time]
+
+    def get(self, job_id: str):
+        return self._posts.get(job_id)
+
+    def upsert(self, post: Post):
+        self._append(posts=[post])
+
+    def upsert_many(self, posts):
+        self._append(posts=list(posts))
+
+    def delete(self, job_id: str) -> bool:
+        if job_id not in self._posts:
+            return False
+        self._append(job_ids=[job_id])
+        return True
+
+    def write_batch(self, posts, job_ids):
+        posts = list(posts)
+        job_ids = [j for j in job_ids if j in self._posts]
+        if posts or job_ids:
+            self._append(posts, job_ids)
+
+    def due_before(self, time_iso: str) -> list:
+        with self._lock:
+            end = bisect.bisect_right(self._by_time, (time_iso, "\uffff"))
+            return [self._posts[job_id] for _, job_id in self._by_time[:end]]
+
+    def load_after(self, time_iso: str, job_id: str, limit: int) -> list:
+        with self._lock:
+            start = bisect.bisect_right(self._by_time, (time_iso, job_id))
+            return [self._posts[j] for _, j in self._by_time[start:start + limit]]
+
+    def count(self) -> int:
+        return len(self._posts)
+
+    def compact(self):
+        # Снимок живых записей пишется во временный файл и атомарно подменяет журнал
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for _, job_id in self._by_time:
+                    f.write(self._line(post=self._posts[job_id]))
+                f.flush()
+                os.fsync(f.fileno())
+            self._fh.close()
+            os.replace(tmp_path, self.path)
+            self._fh = open(self.path, "a", encoding="utf-8")
+            self._entries = len(self._posts)
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+
+class WriteBehind:
+    # Фоновая запись в хранилище. Изменения копятся в памяти (по каждому job_id
+    # остаётся только последнее) и отдельный поток сбрасывает их одним пакетом
+    # через window секунд после первого изменения — цикл событий не ждёт диска.
+    # get() видит ещё не записанные изменения. При ошибке записи пакет
+    # возвращается в очередь (более новые изменения не перетираются).
+
+    def __init__(self, store: PostStore, window: float = 0.05, on_flush=None):
+        self.store = store
+        self.window = window
+        self.on_flush = on_flush            # on_flush(секунд, записей) — после каждого пакета
+        self._cond = threading.Condition()
+        self._pending = {}                  # job_id -> пост или None (удалён)
+        self._inflight = {}                 # пакет, который пишется прямо сейчас
+        self._urgent = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="post-store-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def put(self, post: Post):
+        self.put_many([post])
+
+    def put_many(self, posts):
+        with self._cond:
+            for post in posts:
+                self._pending[post.job_id] = post
+            self._cond.notify_all()
+
+    def delete(self, job_id: str):
+        with self._cond:
+            self._pending[job_id] = None
+            self._cond.notify_all()
+
+    def get(self, job_id: str):
+        with self._cond:
+            for batch in (self._pending, self._inflight):
+                if job_id in batch:
+                    return batch[job_id]
+        return self.store.get(job_id)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while not (self._urgent or self._closed) and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._urgent = False
+
+            ok = self._write(batch)
+
+            with self._cond:
+                self._inflight = {}
+                if not ok:
+                    for job_id, post in batch.items():
+                        self._pending.setdefault(job_id, post)
+                self._cond.notify_all()
+            if not ok:
+                if self._closed:
+                    logging.error(f"Хранилище закрывается, не записано изменений: {len(self._pending)}")
+                    return
+                time.sleep(1)
+
+    def _write(self, batch: dict) -> bool:
+        started = time.perf_counter()
+        try:
+            self.store.write_batch(
+                [p for p in batch.values() if p is not None],
+                [job_id for job_id, p in batch.items() if p is None],
+            )
+        except Exception as e:
+            logging.error(f"Ошибка записи {len(batch)} изменений в хранилище: {e}")
+            return False
+        if self.on_flush:
+            self.on_flush(time.perf_counter() - started, len(batch))
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        # Блокирует до записи всего, что накоплено к этому моменту
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout)
+
+    def close(self, timeout: float = 10):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+def open_store(backend: str, path: str) -> PostStore:
+    if backend == "sqlite":
+        return SQLitePostStore(path)
+    if backend == "journal":
+        return JournalPostStore(path)
+    raise ValueError(f"Неизвестный backend хранилища: {backend}")
+
+
+def migrate_from_json(json_path: str, store: PostStore) -> int:
+    # Разовый перенос старого scheduled_posts.json; файл переименовывается,
+    # чтобы миграция не повторялась при следующем запуске
+    if not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            posts = json.load(f)
+    except Exception as e:
+        logging.error(f"Ошибка чтения {json_path} при миграции: {e}")
+        return 0
+
+    posts = [Post.from_row(p) for p in posts if p.get("job_id") and p.get("time_iso")]
+    store.upsert_many(posts)
+    os.replace(json_path, json_path + ".migrated")
+    logging.info(f"Перенесено {len(posts)} постов из {json_path}")
+    return len(posts)
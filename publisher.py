@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+
+
+# ─── Исходящая очередь публикаций ───
+# Все отправки в каналы проходят через один Publisher: задания упорядочены по
+# времени срабатывания, темп ограничен token bucket'ами (общим и на каждый чат),
+# TelegramRetryAfter выдерживается, сетевые ошибки повторяются с backoff.
+# Отправки в разные чаты идут параллельно (не больше concurrency одновременно),
+# в один чат — строго по очереди.
+#
+# У каждого чата своя очередь. Готовы к отправке чаты, у которых есть токен
+# и нет отправки в процессе; из них первой уходит самая ранняя отправка.
+# Чат с пустым ведром откладывается до появления токена, а чат, ждущий
+# RetryAfter, занимает одно место из concurrency — остальные чаты не ждут.
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate                # токенов в секунду
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        # Сколько ждать до появления токена (0 — можно отправлять)
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        # После RetryAfter опустошаем ведро, чтобы следующие отправки тоже подождали
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class Publisher:
+    def __init__(self, global_rate: float = 25, chat_rate: float = 1 / 3, chat_burst: float = 5,
+                 max_attempts: int = 5, base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 concurrency: int = 10):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self._queues = {}               # chat_id -> куча (fire_time, seq, send, label, future)
+        self._ready = []                # куча (fire_time, seq, chat_id) — головы очередей чатов с токеном
+        self._throttled = []            # куча (когда появится токен, chat_id)
+        self._throttled_chats = set()
+        self._depth = 0
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._slots = None
+        self._busy = set()              # чаты, отправка в которые сейчас выполняется
+        self._tasks = set()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def submit(self, fire_time: float, chat_id, send, label: str = "") -> asyncio.Future:
+        # send — функция без аргументов, возвращающая корутину вызова Bot API
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(chat_id, [])
+        heapq.heappush(queue, (fire_time, next(self._seq), send, label, future))
+        self._depth += 1
+        if queue[0][4] is future and chat_id not in self._throttled_chats and chat_id not in self._busy:
+            self._push_ready(chat_id)
+        self._wakeup.set()
+        return future
+
+    def _push_ready(self, chat_id):
+        queue = self._queues.get(chat_id)
+        if queue:
+            heapq.heappush(self._ready, (queue[0][0], queue[0][1], chat_id))
+
+    def _head(self):
+        # Самая ранняя отправка среди чатов с токеном; устаревшие записи
+        # (голова очереди чата с тех пор сменилась) отбрасываются
+        while self._ready:
+            fire_time, seq, chat_id = self._ready[0]
+            queue = self._queues.get(chat_id)
+            if queue and queue[0][1] == seq and chat_id not in self._throttled_chats and chat_id not in self._busy:
+                return chat_id
+            heapq.heappop(self._ready)
+        return None
+
+    def start(self):
+        if self._worker is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._throttled and self._throttled[0][0] <= now:
+                _, chat_id = heapq.heappop(self._throttled)
+                self._throttled_chats.discard(chat_id)
+                self._push_ready(chat_id)
+
+            chat_id = self._head()
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = self._throttled[0][0] - now if self._throttled else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self.global_bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            bucket = self._chat_bucket(chat_id)
+            wait = bucket.delay()
+            if wait > 0:
+                # Следующие отправки этого чата тоже ждут: порядок внутри чата сохраняется
+                heapq.heappop(self._ready)
+                heapq.heappush(self._throttled, (now + wait, chat_id))
+                self._throttled_chats.add(chat_id)
+                continue
+
+            heapq.heappop(self._ready)
+            queue = self._queues[chat_id]
+            _, _, send, label, future = heapq.heappop(queue)
+            self._depth -= 1
+            if future.cancelled():
+                self._release(chat_id)
+                continue
+            if not queue:
+                del self._queues[chat_id]
+            self.global_bucket.take()
+            bucket.take()
+            # Следующая отправка в чат станет готовой, когда завершится эта
+            self._busy.add(chat_id)
+            await self._slots.acquire()
+            task = asyncio.create_task(self._send_in_order(chat_id, send, label, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _release(self, chat_id):
+        # Чат снова может отправлять: его следующая отправка становится готовой
+        self._busy.discard(chat_id)
+        if self._queues.get(chat_id):
+            if chat_id not in self._throttled_chats:
+                self._push_ready(chat_id)
+        else:
+            self._queues.pop(chat_id, None)
+        self._wakeup.set()
+
+    async def _send_in_order(self, chat_id, send, label: str, future: asyncio.Future):
+        try:
+            await self._send(chat_id, send, label, future)
+        finally:
+            self._slots.release()
+            self._release(chat_id)
+
+    async def _send(self, chat_id, send, label: str, future: asyncio.Future):
+        attempt = 0
+        while True:
+            try:
+                result = await send()
+            except TelegramRetryAfter as e:
+                # Лимит Telegram не считается попыткой: ждём сколько сказали
+                logging.warning(f"Flood limit для {chat_id} ({label}), ждём {e.retry_after} с")
+                self._chat_bucket(chat_id).pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+                logging.warning(f"Ошибка отправки {label} (попытка {attempt}): {e}, повтор через {backoff} с")
+                await asyncio.sleep(backoff)
+                continue
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+
+            if not future.done():
+                future.set_result(result)
+            return
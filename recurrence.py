@@ -0,0 +1,152 @@
+import re
+from datetime import datetime, timedelta
+
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+
+# ─── Повторяющиеся посты ───
+# Серия хранится одной записью: поле repeat описывает правило, time_iso —
+# ближайшее срабатывание. В планировщике серии соответствует одна задача
+# с CronTrigger/IntervalTrigger; следующие даты вычисляются по требованию
+# и нигде не хранятся.
+#
+#   {"cron": "30 9 * * mon-fri"}   — минута, час, день, месяц, день недели
+#   {"every": 10800}               — интервал в секундах от time_iso
+#
+# Числовые дни недели понимаются как в crontab (0 и 7 — воскресенье) и при
+# разборе заменяются именами: APScheduler 3 считает 0 понедельником.
+
+MIN_INTERVAL = 60
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+WEEKDAY_NAMES = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+_UNITS = {"м": 60, "m": 60, "ч": 3600, "h": 3600, "д": 86400, "d": 86400}
+_INTERVAL_RE = re.compile(r"^(?:каждые|каждый|каждую|every)?\s*(\d+)\s*([мmчhдd])\w*$", re.IGNORECASE)
+_DOW_RE = re.compile(r"^(\*|\d+)(?:-(\d+))?(?:/(\d+))?$")
+_CRONTAB_DAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def preset(kind: str, when: datetime) -> dict:
+    if kind == "daily":
+        return {"cron": f"{when.minute} {when.hour} * * *"}
+    if kind == "weekly":
+        return {"cron": f"{when.minute} {when.hour} * * {WEEKDAYS[when.weekday()]}"}
+    raise ValueError(f"Неизвестный вариант повтора: {kind}")
+
+
+def reanchor(repeat: dict, old: datetime, new: datetime) -> dict:
+    # Пресет «ежедневно/еженедельно» привязан ко времени поста — при переносе
+    # поста переносится и он. Интервалы и свои crontab остаются как есть
+    for kind in ("daily", "weekly"):
+        if repeat == preset(kind, old):
+            return preset(kind, new)
+    return repeat
+
+
+def parse_repeat(text: str, when: datetime) -> dict:
+    # "ежедневно", "еженедельно", "каждые 3 ч", "90 мин" или crontab из пяти полей
+    text = " ".join(text.strip().lower().split())
+    if text in ("daily", "ежедневно", "каждый день"):
+        return preset("daily", when)
+    if text in ("weekly", "еженедельно", "каждую неделю"):
+        return preset("weekly", when)
+
+    match = _INTERVAL_RE.match(text)
+    if match:
+        seconds = int(match.group(1)) * _UNITS[match.group(2)]
+        if seconds < MIN_INTERVAL:
+            raise ValueError("Интервал не может быть меньше минуты.")
+        return {"every": seconds}
+
+    try:
+        repeat = {"cron": normalize_cron(text)}
+        make_trigger(repeat, when)
+    except ValueError:
+        raise ValueError(
+            "Не удалось разобрать повтор. Примеры: <code>каждые 6 ч</code>, "
+            "<code>ежедневно</code>, <code>30 9 * * mon-fri</code>"
+        ) from None
+    return repeat
+
+
+def _crontab_weekdays(field: str) -> str:
+    # Числовые дни недели crontab (0–7, 0 и 7 — воскресенье; диапазоны и шаг)
+    # -> имена; «*» и имена остаются как есть
+    out = []
+    for part in field.split(","):
+        match = _DOW_RE.match(part)
+        if not match or part == "*":
+            out.append(part)
+            continue
+        first, last, step = match.groups()
+        if first == "*":
+            first, last = 0, 6
+        else:
+            first = int(first)
+            last = int(last) if last is not None else (6 if step else first)
+        step = int(step) if step else 1
+        if last > 7 or first > last or step == 0:
+            raise ValueError(f"crontab: неверный день недели {part}")
+        for day in range(first, last + 1, step):
+            if _CRONTAB_DAYS[day] not in out:
+                out.append(_CRONTAB_DAYS[day])
+    return ",".join(out)
+
+
+def normalize_cron(text: str) -> str:
+    fields = text.split()
+    if len(fields) != 5:
+        raise ValueError("crontab: ожидается пять полей")
+    fields[4] = _crontab_weekdays(fields[4])
+    return " ".join(fields)
+
+
+def make_trigger(repeat: dict, start: datetime, timezone=None):
+    if "every" in repeat:
+        return IntervalTrigger(seconds=repeat["every"], start_date=start, timezone=timezone)
+    minute, hour, day, month, day_of_week = normalize_cron(repeat["cron"]).split()
+    return CronTrigger(
+        minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week,
+        start_date=start, timezone=timezone,
+    )
+
+
+def _local(dt: datetime) -> datetime:
+    return dt.astimezone().replace(tzinfo=None)
+
+
+def upcoming(repeat: dict, start: datetime, after: datetime, count: int, timezone=None) -> list:
+    # Ближайшие count срабатываний строго после after (не раньше start)
+    trigger = make_trigger(repeat, start, timezone)
+    out = []
+    moment = after.astimezone() + timedelta(microseconds=1)
+    while len(out) < count:
+        fire = trigger.get_next_fire_time(None, moment)
+        if fire is None:
+            break
+        out.append(_local(fire))
+        moment = fire + timedelta(microseconds=1)
+    return out
+
+
+def next_occurrence(repeat: dict, start: datetime, after: datetime, timezone=None):
+    found = upcoming(repeat, start, after, 1, timezone)
+    return found[0] if found else None
+
+
+def describe(repeat: dict) -> str:
+    if "every" in repeat:
+        seconds = repeat["every"]
+        for unit, size in (("дн", 86400), ("ч", 3600), ("мин", 60)):
+            if seconds % size == 0:
+                return f"каждые {seconds // size} {unit}"
+        return f"каждые {seconds} с"
+
+    minute, hour, day, month, day_of_week = repeat["cron"].split()
+    if minute.isdigit() and hour.isdigit() and day == "*" and month == "*":
+        at = f"{int(hour):02d}:{int(minute):02d}"
+        if day_of_week == "*":
+            return f"ежедневно в {at}"
+        if day_of_week in WEEKDAYS:
+            return f"еженедельно, {WEEKDAY_NAMES[WEEKDAYS.index(day_of_week)]} в {at}"
+    return f"cron: {repeat['cron']}"
@@ -0,0 +1,185 @@
+import bisect
+import re
+from datetime import datetime, time
+from html import unescape
+
+from post_model import Post
+from validation import parse_date
+
+
+# ─── Поиск по отложенным постам ───
+# Обратный индекс: слово -> множество job_id постов, в тексте или подписях
+# кнопок которых оно встречается. Индекс обновляется вместе с реестром (при
+# создании, правке, удалении и публикации), поэтому запрос не перебирает посты.
+#
+# Слово запроса длиной от PREFIX_MIN символов ищется как префикс («распрод»
+# найдёт «распродажа»): словарь хранится отсортированным, и все слова с
+# префиксом — один отрезок, найденный бинарным поиском. Несколько слов
+# запроса — пересечение, начиная с самого короткого множества.
+#
+# Фильтр по датам и порядок выдачи берутся из индекса времени реестра:
+# если совпадений намного меньше, чем постов в интервале, совпадения
+# фильтруются и сортируются, иначе интервал реестра проходится по порядку с
+# проверкой принадлежности — работа определяется меньшим из двух.
+
+PREFIX_MIN = 3
+RESULTS_CACHED = 32                 # сколько последних выдач помнить для листания страниц
+SORT_COST = 8                       # во сколько раз сортировка совпадения дороже проверки поста интервала
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"\w+")
+_DATE = re.compile(r"\d{1,2}\.\d{1,2}\.\d{4}")
+
+
+def words(text: str) -> set:
+    # Текст поста хранится в HTML: теги и сущности в поиск не попадают
+    if not text:
+        return set()
+    return set(_WORD.findall(unescape(_TAG.sub(" ", text)).lower().replace("ё", "е")))
+
+
+def post_words(post: Post) -> frozenset:
+    found = words(post.text)
+    for row in post.buttons or ():
+        for button in row:
+            found |= words(button.get("text"))
+    return frozenset(found)
+
+
+def parse_query(text: str):
+    # "слова [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ]" или "слова ДД.ММ.ГГГГ" (один день).
+    # Возвращает (слова, начало, конец) — начало и конец datetime или None
+    tokens = text.split()
+    terms, start, end, day = [], None, None, None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i].lower()
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if token in ("с", "от") and _DATE.fullmatch(following):
+            start = datetime.combine(parse_date(following), time.min)
+            i += 2
+            continue
+        if token in ("по", "до") and _DATE.fullmatch(following):
+            end = datetime.combine(parse_date(following), time.max)
+            i += 2
+            continue
+        if _DATE.fullmatch(token):
+            day = parse_date(token)
+        else:
+            terms.extend(words(tokens[i]))
+        i += 1
+    if day is not None and start is None and end is None:
+        start, end = datetime.combine(day, time.min), datetime.combine(day, time.max)
+    if not terms and start is None and end is None:
+        raise ValueError("Укажите слова для поиска или период.")
+    if start and end and start > end:
+        raise ValueError("Начало периода позже конца.")
+    return terms, start, end
+
+
+class SearchIndex:
+    def __init__(self, registry):
+        self.registry = registry        # PostRegistry: посты и индекс времени
+        self._postings = {}             # слово -> set(job_id)
+        self._by_job = {}               # job_id -> frozenset слов поста
+        self._vocabulary = []           # все слова по алфавиту — для поиска по префиксу
+        self._results = {}              # (слова, начало, конец) -> [job_id]
+        self.add_many(registry)
+
+    def __len__(self):
+        return len(self._by_job)
+
+    def add(self, post: Post):
+        self.add_many((post,))
+
+    def add_many(self, posts):
+        self._results.clear()       # даже без смены текста могло измениться время — порядок выдачи
+        fresh = set()
+        for post in posts:
+            found = post_words(post)
+            old = self._by_job.get(post.job_id)
+            if old == found:
+                continue
+            if old is not None:
+                self._unlink(post.job_id, old - found)
+            self._by_job[post.job_id] = found
+            for word in found - (old or frozenset()):
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = set()
+                    fresh.add(word)
+                postings.add(post.job_id)
+        # Новые слова вставляются в словарь разом: одна сортировка почти
+        # упорядоченного списка вместо вставки каждого слова по отдельности
+        fresh = [word for word in fresh if word in self._postings]
+        if len(fresh) == 1:
+            bisect.insort(self._vocabulary, fresh[0])
+        elif fresh:
+            self._vocabulary.extend(fresh)
+            self._vocabulary.sort()
+
+    def remove(self, job_id: str):
+        found = self._by_job.pop(job_id, None)
+        if found is not None:
+            self._results.clear()
+            self._unlink(job_id, found)
+
+    def _unlink(self, job_id: str, found):
+        for word in found:
+            postings = self._postings[word]
+            postings.discard(job_id)
+            if not postings:
+                del self._postings[word]
+                i = bisect.bisect_left(self._vocabulary, word)
+                if i < len(self._vocabulary) and self._vocabulary[i] == word:
+                    del self._vocabulary[i]
+
+    def _matching(self, term: str) -> set:
+        if len(term) < PREFIX_MIN:
+            return self._postings.get(term, set())
+        lo = bisect.bisect_left(self._vocabulary, term)
+        hi = bisect.bisect_left(self._vocabulary, term + "\uffff")
+        if hi - lo == 1:
+            return self._postings[self._vocabulary[lo]]
+        found = set()
+        for word in self._vocabulary[lo:hi]:
+            found |= self._postings[word]
+        return found
+
+    def _candidates(self, terms):
+        if not terms:
+            return None             # без слов — все посты интервала
+        sets = sorted((self._matching(t) for t in set(terms)), key=len)
+        found = set(sets[0])
+        for other in sets[1:]:
+            if not found:
+                break
+            found &= other
+        return found
+
+    def search(self, terms, start: datetime = None, end: datetime = None) -> list:
+        # job_id найденных постов в порядке времени публикации
+        key = (tuple(sorted(set(terms))), start, end)
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        start_iso = start.isoformat() if start else ""
+        end_iso = end.isoformat() if end else "\uffff"
+        first, last = self.registry.span(start_iso, end_iso)
+        candidates = self._candidates(terms)
+        if candidates is None:
+            result = self.registry.job_ids(first, last)
+        elif len(candidates) * SORT_COST < last - first:
+            posts = (self.registry.get(job_id) for job_id in candidates)
+            result = [
+                job_id for _, job_id in
+                sorted((p.time_iso, p.job_id) for p in posts if start_iso <= p.time_iso <= end_iso)
+            ]
+        else:
+            result = [job_id for job_id in self.registry.job_ids(first, last) if job_id in candidates]
+
+        if len(self._results) >= RESULTS_CACHED:
+            del self._results[next(iter(self._results))]
+        self._results[key] = result
+        return result
@@ -0,0 +1,171 @@
+import bisect
+import math
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from post_model import Post
+
+
+# ─── Распределение времени публикаций ───
+# Для каждого канала хранится отсортированный список (время, job_id)
+# запланированных публикаций. Два поста одного канала должны отстоять друг от
+# друга не меньше чем на spacing (общий или свой для канала); find_slot ищет
+# ближайшее свободное время не раньше запрошенного — пост только сдвигается
+# позже, никогда раньше. Серия занимает слот своего ближайшего срабатывания.
+#
+# Чтобы поиск не шёл пост за постом по плотной серии (тысяча постов на одну
+# минуту из импорта), канал хранит ещё и «блоки» — цепочки постов, между
+# соседями которых нового поста не вставить (ближе 2 * spacing). Запретная
+# зона блока — (первый - spacing, последний + spacing), поэтому свободное
+# время ищется бинарным поиском по блокам, а не перебором постов.
+#
+# Здесь же выдаются job_id: post_<user>_<unix-время>, при совпадении —
+# с суффиксом _2, _3, ...
+
+
+class _Lane:
+    # Публикации одного канала: посты и блоки
+    __slots__ = ("spacing", "slots", "firsts", "lasts")
+
+    def __init__(self, spacing: float):
+        self.spacing = spacing
+        self.slots = []             # [(время, job_id)]
+        self.firsts = []            # время первого поста блока
+        self.lasts = []             # время последнего поста блока
+
+    def add(self, ts: float, job_id: str):
+        bisect.insort(self.slots, (ts, job_id))
+        gap = 2 * self.spacing
+        # Блоки, до которых от ts меньше 2 * spacing, сливаются в один
+        lo = bisect.bisect_right(self.lasts, ts - gap)
+        hi = bisect.bisect_left(self.firsts, ts + gap)
+        first, last = ts, ts
+        if lo < hi:
+            first, last = min(self.firsts[lo], ts), max(self.lasts[hi - 1], ts)
+            del self.firsts[lo:hi], self.lasts[lo:hi]
+        self.firsts.insert(lo, first)
+        self.lasts.insert(lo, last)
+
+    def remove(self, ts: float, job_id: str):
+        i = bisect.bisect_left(self.slots, (ts, job_id))
+        if i == len(self.slots) or self.slots[i] != (ts, job_id):
+            return
+        del self.slots[i]
+        k = bisect.bisect_right(self.firsts, ts) - 1
+        first, last = self.firsts[k], self.lasts[k]
+        prev = self.slots[i - 1][0] if i > 0 and self.slots[i - 1][0] >= first else None
+        nxt = self.slots[i][0] if i < len(self.slots) and self.slots[i][0] <= last else None
+        if prev is None and nxt is None:
+            del self.firsts[k], self.lasts[k]
+        elif prev is None:
+            self.firsts[k] = nxt
+        elif nxt is None:
+            self.lasts[k] = prev
+        elif nxt - prev >= 2 * self.spacing:
+            # Без этого поста между соседями снова помещается слот — блок делится
+            self.lasts[k] = prev
+            self.firsts.insert(k + 1, nxt)
+            self.lasts.insert(k + 1, last)
+
+    def next_free(self, ts: float) -> float:
+        # ts, если оно свободно, иначе конец запретной зоны блока, в который оно попало
+        if self.spacing <= 0:
+            return ts
+        k = bisect.bisect_left(self.firsts, ts + self.spacing) - 1
+        if k >= 0 and self.lasts[k] > ts - self.spacing:
+            return self.lasts[k] + self.spacing
+        return ts
+
+    def near(self, ts: float):
+        # Посты ближе spacing к ts (ровно spacing — уже не конфликт)
+        if self.spacing <= 0:
+            return []
+        i = bisect.bisect_right(self.slots, (ts - self.spacing, "\uffff"))
+        j = bisect.bisect_left(self.slots, (ts + self.spacing, ""))
+        return self.slots[i:j]
+
+
+class SlotAllocator:
+    def __init__(self, channels, spacing: timedelta = timedelta(0), per_channel: dict = None, align: int = 60,
+                 posts=()):
+        self.channels = channels
+        self.spacing = spacing.total_seconds()
+        self.per_channel = {c: s.total_seconds() for c, s in (per_channel or {}).items()}
+        self.align = align          # сдвинутое время округляется вверх до кратного align секунд
+        self._lanes = {}            # chat_id -> _Lane
+        self._by_job = {}           # job_id -> (время, чаты)
+        for post in posts:
+            self.add(post)
+
+    def __contains__(self, job_id: str):
+        return job_id in self._by_job
+
+    def _lane(self, chat_id) -> _Lane:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _Lane(self.per_channel.get(chat_id, self.spacing))
+        return lane
+
+    def _chats(self, targets):
+        return list(targets or self.channels)
+
+    def add(self, post: Post):
+        self._insert(post.job_id, post.when.timestamp(), self._chats(post.targets))
+
+    def _insert(self, job_id: str, ts: float, chats):
+        self.remove(job_id)
+        self._by_job[job_id] = (ts, chats)
+        for chat_id in chats:
+            self._lane(chat_id).add(ts, job_id)
+
+    def remove(self, job_id: str):
+        entry = self._by_job.pop(job_id, None)
+        if entry is None:
+            return None
+        ts, chats = entry
+        for chat_id in chats:
+            self._lane(chat_id).remove(ts, job_id)
+        return entry
+
+    @contextmanager
+    def _excluding(self, job_id):
+        # Редактируемый пост не мешает сам себе
+        entry = self.remove(job_id) if job_id else None
+        try:
+            yield
+        finally:
+            if entry:
+                self._insert(job_id, *entry)
+
+    def conflicts(self, when: datetime, targets=None, exclude: str = None) -> list:
+        # [(chat_id, job_id, время)] — с чем пересекается публикация в when
+        ts = when.timestamp()
+        with self._excluding(exclude):
+            return [
+                (chat_id, job_id, datetime.fromtimestamp(other))
+                for chat_id in self._chats(targets)
+                for other, job_id in self._lane(chat_id).near(ts)
+            ]
+
+    def find_slot(self, when: datetime, targets=None, exclude: str = None) -> datetime:
+        # Каждый сдвиг переносит время за конец блока, поэтому цикл конечен
+        ts = when.timestamp()
+        lanes = [self._lane(c) for c in self._chats(targets)]
+        shifted = True
+        with self._excluding(exclude):
+            while shifted:
+                shifted = False
+                for lane in lanes:
+                    free = lane.next_free(ts)
+                    if free != ts:
+                        ts = math.ceil(free / self.align) * self.align if self.align else free
+                        shifted = True
+        return when if ts == when.timestamp() else datetime.fromtimestamp(ts)
+
+    def job_id(self, user_id, when: datetime, taken=()) -> str:
+        base = f"post_{user_id}_{int(when.timestamp())}"
+        job_id, n = base, 1
+        while job_id in self._by_job or job_id in taken:
+            n += 1
+            job_id = f"{base}_{n}"
+        return job_id
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+
+# ─── Очередь апдейтов по чатам ───
+# Апдейты одного чата обрабатываются строго по очереди, в порядке получения:
+# обработчики читают и меняют FSM-данные и реестр постов, и два параллельных
+# апдейта одного админа (двойное нажатие «Опубликовать», сообщение вдогонку
+# кнопке) иначе гонялись бы между собой. Разные чаты идут параллельно, но не
+# больше concurrency обработчиков одновременно.
+#
+# Перегрузка: если в очереди чата уже max_chat_queue апдейтов или всего ждут
+# max_pending, новый апдейт отклоняется сразу с коротким ответом — лучше
+# отказать, чем отвечать через минуту. Повторное нажатие той же кнопки того же
+# сообщения в течение duplicate_window отбрасывается без обработки.
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()      # отдаёт блокировку в порядке ожидания
+        self.depth = 0
+
+
+class ChatQueueMiddleware(BaseMiddleware):
+    def __init__(self, concurrency: int = 32, max_chat_queue: int = 10, max_pending: int = 500,
+                 duplicate_window: float = 1.0):
+        self.concurrency = concurrency
+        self.max_chat_queue = max_chat_queue
+        self.max_pending = max_pending
+        self.duplicate_window = duplicate_window
+        self.pending = 0
+        self.shed = 0
+        self.duplicates = 0
+        self._queues = {}
+        self._recent = OrderedDict()    # (чат, сообщение, data) -> время нажатия
+        self._slots = None
+
+    async def __call__(self, handler, event: Update, data):
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else user.id if user else None
+        if key is None:
+            return await handler(event, data)
+
+        if event.callback_query and self._is_duplicate(key, event.callback_query):
+            self.duplicates += 1
+            await self._reply(event.callback_query.answer())
+            return None
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ChatQueue()
+        if queue.depth >= self.max_chat_queue or self.pending >= self.max_pending:
+            self.shed += 1
+            logging.warning(f"Апдейт {event.update_id} из чата {key} отклонён: очередь переполнена")
+            await self._reject(event)
+            return None
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        queue.depth += 1
+        self.pending += 1
+        try:
+            # Слот берётся уже внутри очереди чата: ожидающие своей очереди
+            # апдейты не занимают места других чатов
+            async with queue.lock:
+                async with self._slots:
+                    return await handler(event, data)
+        finally:
+            queue.depth -= 1
+            self.pending -= 1
+            if not queue.depth:
+                del self._queues[key]
+
+    def _is_duplicate(self, key, callback) -> bool:
+        now = time.monotonic()
+        while self._recent:
+            oldest, pressed = next(iter(self._recent.items()))
+            if now - pressed <= self.duplicate_window:
+                break
+            del self._recent[oldest]
+        message_id = callback.message.message_id if callback.message else callback.inline_message_id
+        tap = (key, message_id, callback.data)
+        if tap in self._recent:
+            return True
+        self._recent[tap] = now
+        return False
+
+    async def _reject(self, event: Update):
+        if event.callback_query:
+            await self._reply(event.callback_query.answer("⏳ Слишком много запросов, повторите чуть позже"))
+        elif event.message:
+            await self._reply(event.message.answer("⏳ Слишком много запросов, повторите чуть позже."))
+
+    @staticmethod
+    async def _reply(call):
+        try:
+            await call
+        except Exception as e:
+            logging.warning(f"Не удалось ответить на отклонённый апдейт: {e}")
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+
+
+# ─── Разбор и проверка полей поста ───
+# Общие правила для пошагового создания (PostForm) и массового импорта.
+# Ошибка — ValueError с текстом, который можно сразу показать админу.
+
+MAX_BUTTONS = 8
+BUTTONS_PER_ROW = 2
+
+
+def parse_buttons(text: str) -> list:
+    # "Текст | https://ссылка" по одной на строку -> ряды по две кнопки
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    if not lines:
+        raise ValueError("Не распознано ни одной кнопки.")
+
+    buttons = []
+    for line in lines:
+        if '|' not in line:
+            raise ValueError(f"Неверный формат:\n{line}")
+        txt, url = [p.strip() for p in line.split('|', 1)]
+        if not txt or not url.startswith(('http://', 'https://')):
+            raise ValueError(f"Ошибка в строке:\n{line}")
+        buttons.append({"text": txt, "url": url})
+
+    if len(buttons) > MAX_BUTTONS:
+        raise ValueError(f"Максимум {MAX_BUTTONS} кнопок.")
+
+    return [buttons[i:i + BUTTONS_PER_ROW] for i in range(0, len(buttons), BUTTONS_PER_ROW)]
+
+
+def parse_date(text: str) -> date:
+    try:
+        return datetime.strptime(text.strip(), '%d.%m.%Y').date()
+    except ValueError:
+        raise ValueError("Формат: ДД.ММ.ГГГГ") from None
+
+
+def parse_time_on(day: date, text: str) -> datetime:
+    try:
+        return datetime.combine(day, datetime.strptime(text.strip(), '%H:%M').time())
+    except ValueError:
+        raise ValueError("Формат: ЧЧ:ММ") from None
+
+
+def parse_datetime(text: str) -> datetime:
+    # "ДД.ММ.ГГГГ ЧЧ:ММ"
+    try:
+        dt_str, tm_str = text.split()
+        return datetime.strptime(f"{dt_str} {tm_str}", '%d.%m.%Y %H:%M')
+    except ValueError:
+        raise ValueError("Формат: ДД.ММ.ГГГГ ЧЧ:ММ") from None
+
+
+def check_future(when: datetime, now: datetime = None):
+    if when <= (now or datetime.now()):
+        raise ValueError("Укажите будущее время.")